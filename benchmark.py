@@ -0,0 +1,404 @@
+"""
+离线性能测试：不连接真实交换机，用桩对象代替交换机、端口和datapath，在fat-tree、leaf-spine、网格和随机拓扑上
+测量short_path.floyd、get_all_short_path_sequence、路径引擎以及Topo的路径计算和流表下发在不同规模下的耗时、
+内存峰值和FlowMod个数，每个测量结果输出为一行JSON，便于保存下来与之后的结果比较
+
+    python -m ryu.topology.benchmark --preset small --output base.jsonl
+    python -m ryu.topology.benchmark --preset small --compare base.jsonl
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import struct
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+from ryu.topology import switches
+from ryu.topology.path_engine import select_engine
+from ryu.topology.short_path import floyd, get_all_short_path_sequence, INF
+from ryu.topology.topo_1 import Topo
+
+FLOYD_MAX_SWITCHES = 128   # 纯Python的floyd是O(n^3)，交换机数超过该值时不测
+PAIR_MAX_HOSTS = 512       # 主机对的个数是主机数的平方，主机数超过该值时不测逐对计算的阶段
+SLOWER_RATIO = 1.2         # 比较两次结果时，耗时超过基准这么多倍的阶段被标出
+SLOWER_MIN = 0.01          # 耗时只比基准多不到这么多秒时不算变慢，避免计时误差
+
+# 每种拓扑在各个规模下的参数，见TOPOLOGIES
+PRESETS = {
+    'small': {
+        'fat_tree': [{'k': 4}],
+        'leaf_spine': [{'spines': 2, 'leaves': 4}],
+        'grid': [{'rows': 4, 'cols': 4}],
+        'random': [{'n': 16, 'degree': 3}],
+    },
+    'medium': {
+        'fat_tree': [{'k': 4}, {'k': 6}, {'k': 8}],
+        'leaf_spine': [{'spines': 2, 'leaves': 4}, {'spines': 4, 'leaves': 16}, {'spines': 8, 'leaves': 32}],
+        'grid': [{'rows': 4, 'cols': 4}, {'rows': 8, 'cols': 8}, {'rows': 12, 'cols': 12}],
+        'random': [{'n': 32, 'degree': 3}, {'n': 64, 'degree': 3}, {'n': 128, 'degree': 4}],
+    },
+    'large': {
+        'fat_tree': [{'k': 8}, {'k': 12}, {'k': 16}],
+        'leaf_spine': [{'spines': 8, 'leaves': 32}, {'spines': 16, 'leaves': 64}, {'spines': 32, 'leaves': 128}],
+        'grid': [{'rows': 12, 'cols': 12}, {'rows': 20, 'cols': 20}, {'rows': 32, 'cols': 32}],
+        'random': [{'n': 128, 'degree': 4}, {'n': 512, 'degree': 4}, {'n': 1024, 'degree': 4}],
+    },
+}
+
+
+def fat_tree(k):
+    """
+    k叉fat-tree：(k/2)^2台核心交换机，k个pod，每个pod有k/2台汇聚交换机和k/2台接入交换机
+    :return: (交换机个数, 链路列表[(dpid1, dpid2)], 连接主机的交换机列表, 每台交换机的主机数)
+    """
+    half = k // 2
+    n_core = half * half
+    core = list(range(1, n_core + 1))
+    edges = []
+    edge_switches = []
+    dpid = n_core
+    for pod in range(k):
+        aggs = list(range(dpid + 1, dpid + half + 1))
+        edge_layer = list(range(dpid + half + 1, dpid + k + 1))
+        dpid += k
+        for i, agg in enumerate(aggs):
+            for edge in edge_layer:
+                edges.append((agg, edge))
+            for core_dpid in core[i * half:(i + 1) * half]:
+                edges.append((core_dpid, agg))
+        edge_switches.extend(edge_layer)
+    return dpid, edges, edge_switches, half
+
+
+def leaf_spine(spines, leaves):
+    """
+    leaf-spine：每台leaf交换机连接所有spine交换机，主机连接在leaf交换机上
+    """
+    edges = [(spine, spines + leaf) for spine in range(1, spines + 1) for leaf in range(1, leaves + 1)]
+    return spines + leaves, edges, list(range(spines + 1, spines + leaves + 1)), 4
+
+
+def grid(rows, cols):
+    """
+    rows行cols列的网格，每台交换机连接上下左右的交换机和一台主机
+    """
+    edges = []
+    for r in range(rows):
+        for c in range(cols):
+            dpid = r * cols + c + 1
+            if c + 1 < cols:
+                edges.append((dpid, dpid + 1))
+            if r + 1 < rows:
+                edges.append((dpid, dpid + cols))
+    n = rows * cols
+    return n, edges, list(range(1, n + 1)), 1
+
+
+def random_graph(n, degree, seed=1):
+    """
+    n台交换机的随机连通图：先生成一棵随机树保证连通，再随机加边直到平均度数约为degree
+    """
+    rng = random.Random(seed)
+    edges = set()
+    for dpid in range(2, n + 1):
+        edges.add((rng.randint(1, dpid - 1), dpid))
+    target = n * degree // 2
+    while len(edges) < target:
+        a, b = rng.sample(range(1, n + 1), 2)
+        edges.add((min(a, b), max(a, b)))
+    return n, sorted(edges), list(range(1, n + 1)), 1
+
+
+TOPOLOGIES = {
+    'fat_tree': fat_tree,
+    'leaf_spine': leaf_spine,
+    'grid': grid,
+    'random': random_graph,
+}
+
+
+class StubDatapath(object):
+    """
+    代替ryu.controller.controller.Datapath：消息照常序列化，但不写socket，只按消息类型统计个数和字节数
+    """
+
+    def __init__(self, dpid):
+        self.id = dpid
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.xid = 0
+        self.counts = {}    # {消息类型: [个数, 字节数]}
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        self.send(msg.buf)
+
+    def send(self, buf):
+        offset = 0
+        while offset < len(buf):
+            _, msg_type, length, _ = struct.unpack_from('!BBHI', buf, offset)
+            count = self.counts.setdefault(msg_type, [0, 0])
+            count[0] += 1
+            count[1] += length
+            offset += length
+
+
+class StubPort(object):
+    """
+    代替ryu.topology.switches.Port，Topo只用到dpid和port_no，并把端口作为字典的键
+    """
+
+    def __init__(self, dpid, port_no):
+        self.dpid = dpid
+        self.port_no = port_no
+
+    def __eq__(self, other):
+        return isinstance(other, StubPort) and (self.dpid, self.port_no) == (other.dpid, other.port_no)
+
+    def __hash__(self):
+        return hash((self.dpid, self.port_no))
+
+
+class StubSwitch(object):
+    def __init__(self, dp):
+        self.dp = dp
+        self.ports = []
+
+
+class StubLink(object):
+    def __init__(self, src, dst):
+        self.src = src
+        self.dst = dst
+
+
+class StubEvent(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def host_address(index):
+    """
+    :return: 第index台主机的(mac, ip)
+    """
+    return ('02:00:%02x:%02x:%02x:%02x' % tuple(struct.pack('!I', index)),
+            '10.%d.%d.%d' % tuple(struct.pack('!I', index)[1:]))
+
+
+def build_topo(n_switches, edges, edge_switches, hosts_per_switch, datapath_factory=StubDatapath, **kwargs):
+    """
+    用桩对象按顺序产生交换机加入和链路加入事件，建立一个Topo，主机直接写入Topo.host，不触发逐个主机的流表下发
+    交换机的流表查询立即以空结果完成，相当于全新的交换机
+    :param datapath_factory: 由dpid创建datapath的函数
+    :return: (Topo, {dpid: StubSwitch})
+    """
+    topo = Topo(**kwargs)
+    sws = {}
+    next_port = {}
+    for dpid in range(1, n_switches + 1):
+        sws[dpid] = StubSwitch(datapath_factory(dpid))
+        next_port[dpid] = 1
+        topo.switch_enter_handler(StubEvent(switch=sws[dpid]))
+    for dpid in list(topo.reconciling):
+        topo.finish_reconcile(dpid, topo.reconciling[dpid])
+    for a, b in edges:
+        port_a, port_b = StubPort(a, next_port[a]), StubPort(b, next_port[b])
+        next_port[a] += 1
+        next_port[b] += 1
+        sws[a].ports.append(port_a)
+        sws[b].ports.append(port_b)
+        topo.link_add_handler(StubEvent(link=StubLink(port_a, port_b)))
+        topo.link_add_handler(StubEvent(link=StubLink(port_b, port_a)))
+    index = 1
+    for dpid in edge_switches:
+        for _ in range(hosts_per_switch):
+            mac, ip = host_address(index)
+            topo.host[mac] = (str(dpid), str(next_port[dpid]), [ip])
+            index += 1
+            next_port[dpid] += 1
+    return topo, sws
+
+
+def distance_matrix(n_switches, edges):
+    dis = np.full((n_switches, n_switches), INF, dtype=np.int64)
+    np.fill_diagonal(dis, 0)
+    for a, b in edges:
+        dis[a - 1][b - 1] = dis[b - 1][a - 1] = 1
+    return dis
+
+
+def message_counts(sws):
+    """
+    :return: 所有交换机上各类消息的个数和字节数之和，并清零
+    """
+    total = {}
+    for sw in sws.values():
+        for msg_type, (count, size) in sw.dp.counts.items():
+            item = total.setdefault(msg_type, [0, 0])
+            item[0] += count
+            item[1] += size
+        sw.dp.counts = {}
+    return total
+
+
+def measure(func, trace_memory=True):
+    """
+    :return: (func的返回值, 耗时(秒), Python分配的内存峰值(字节)，不跟踪内存时为None)
+    跟踪内存会让耗时变长，只比较耗时时可以关闭
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_case(topology, params, modes, hosts_per_switch=None, trace_memory=True):
+    """
+    测量一个拓扑的各个阶段
+        floyd: short_path.floyd
+        all_short_path_sequence: short_path.get_all_short_path_sequence
+        path_engine: select_engine自动选出的路径引擎
+        host_routes: Topo.compute_path_between_all_hosts
+        recompute: 按各转发模式第一次计算并下发所有流表项
+        host_add: 之后再加入一台主机(ecmp模式除外)
+    :param modes: 要测量的转发模式
+    :param hosts_per_switch: 每台连接主机的交换机上的主机数，None表示使用拓扑的默认值
+    :return: 测量结果列表，每项为一个字典
+    """
+    n_switches, edges, edge_switches, default_hosts = TOPOLOGIES[topology](**params)
+    if hosts_per_switch is None:
+        hosts_per_switch = default_hosts
+    n_hosts = len(edge_switches) * hosts_per_switch
+    base = {'topology': topology, 'params': params, 'switches': n_switches, 'links': len(edges),
+            'hosts': n_hosts}
+    results = []
+
+    def record(stage, elapsed, peak, mode=None, counts=None, **extra):
+        item = dict(base, stage=stage, mode=mode, wall_time=round(elapsed, 6), peak_memory=peak)
+        if counts is not None:
+            flow_mod = counts.get(ofproto_v1_3.OFPT_FLOW_MOD, [0, 0])
+            item['flow_mods'] = flow_mod[0]
+            item['messages'] = sum(count for count, _ in counts.values())
+            item['bytes'] = sum(size for _, size in counts.values())
+        item.update(extra)
+        results.append(item)
+
+    dis = distance_matrix(n_switches, edges)
+    if n_switches <= FLOYD_MAX_SWITCHES:
+        _, elapsed, peak = measure(lambda: floyd(n_switches, dis.tolist()), trace_memory)
+        record('floyd', elapsed, peak)
+    _, elapsed, peak = measure(lambda: get_all_short_path_sequence(n_switches, dis), trace_memory)
+    record('all_short_path_sequence', elapsed, peak)
+    engine = select_engine(n_switches, dis)
+    _, elapsed, peak = measure(lambda: engine.compute(n_switches, dis.copy()), trace_memory)
+    record('path_engine', elapsed, peak, engine=engine.name)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):   # Topo逐条打印事件
+        if n_hosts <= PAIR_MAX_HOSTS:
+            topo, sws = build_topo(n_switches, edges, edge_switches, hosts_per_switch)
+            routes, elapsed, peak = measure(topo.compute_path_between_all_hosts, trace_memory)
+            record('host_routes', elapsed, peak, routes=len(routes))
+        for mode in modes:
+            if mode == 'pair' and n_hosts > PAIR_MAX_HOSTS:
+                continue
+            topo, sws = build_topo(n_switches, edges, edge_switches, hosts_per_switch)
+            topo.forwarding_mode = mode
+            message_counts(sws)
+            _, elapsed, peak = measure(lambda: topo.recompute_routes(topo.recompute_scheduler.version, []),
+                                       trace_memory)
+            flows = sum(len(flows) for flows in topo.installed_flows.values())
+            record('recompute', elapsed, peak, mode, message_counts(sws), flow_entries=flows)
+            if mode == 'ecmp':
+                continue            # ecmp模式的主机变化交给整体重算，与recompute阶段相同
+            dpid = edge_switches[0]
+            mac, ip = host_address(n_hosts + 1)
+            host = switches.Host(mac, '%d:%d' % (dpid, 0xff00))
+            host.ipv4.append(ip)
+            _, elapsed, peak = measure(lambda: topo.Host_Add_Handler(StubEvent(host=host)), trace_memory)
+            record('host_add', elapsed, peak, mode, message_counts(sws))
+    return results
+
+
+def compare(baseline, results, ratio=SLOWER_RATIO, min_delta=SLOWER_MIN):
+    """
+    按(拓扑, 参数, 阶段, 转发模式)对比两次测量的耗时和FlowMod个数
+    :return: 变慢超过ratio倍且超过min_delta秒，或FlowMod个数不同的项，每项为(键, 基准结果, 本次结果)
+    """
+    def key(item):
+        return (item['topology'], json.dumps(item['params'], sort_keys=True), item['stage'], item['mode'])
+
+    base = dict((key(item), item) for item in baseline)
+    changed = []
+    for item in results:
+        old = base.get(key(item))
+        if old is None:
+            continue
+        slower = item['wall_time'] > max(old['wall_time'] * ratio, old['wall_time'] + min_delta)
+        if slower or item.get('flow_mods') != old.get('flow_mods'):
+            changed.append((key(item), old, item))
+    return changed
+
+
+def load_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='offline benchmark of the path and flow pipeline')
+    parser.add_argument('--preset', default='small', choices=sorted(PRESETS))
+    parser.add_argument('--topology', action='append', choices=sorted(TOPOLOGIES),
+                        help='only run these topologies (repeatable)')
+    parser.add_argument('--modes', default='pair,tree,ecmp', help='comma separated forwarding modes')
+    parser.add_argument('--hosts-per-switch', type=int, default=None)
+    parser.add_argument('--no-memory', action='store_true', help='do not trace memory (more accurate timing)')
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    parser.add_argument('--compare', help='baseline results to compare against')
+    args = parser.parse_args(argv)
+
+    modes = [mode for mode in args.modes.split(',') if mode]
+    results = []
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for topology, cases in sorted(PRESETS[args.preset].items()):
+            if args.topology and topology not in args.topology:
+                continue
+            for params in cases:
+                for item in run_case(topology, params, modes, args.hosts_per_switch, not args.no_memory):
+                    out.write(json.dumps(item, sort_keys=True) + '\n')
+                    out.flush()
+                    results.append(item)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.compare:
+        changed = compare(load_results(args.compare), results)
+        for (topology, params, stage, mode), old, new in changed:
+            sys.stderr.write('%s %s %s %s: %.6fs -> %.6fs, flow mods %s -> %s\n' % (
+                topology, params, stage, mode, old['wall_time'], new['wall_time'],
+                old.get('flow_mods'), new.get('flow_mods')))
+        return 1 if changed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
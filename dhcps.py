@@ -1,25 +1,66 @@
-
+from ryu import cfg
 from ryu.base import app_manager
+from ryu.controller.event import EventBase
 from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.lib import addrconv, hub
 from ryu.lib.packet import dhcp, ethernet
 from ryu.lib.packet import ipv4, packet, udp, arp
+from ryu.lib.packet import ether_types, in_proto, packet_utils
 from ryu.ofproto import ofproto_v1_3
 from ryu.topology import event
 from ryu.topology import switches
 import threading
 import struct
-import random
 import time
 
+from ryu.topology.lease import AddressPool, LeaseStore, parse_pool, parse_range, ip_to_int, int_to_ip
+from ryu.topology.proxy_arp import ProxyArp, arp_reply
+from ryu.topology.lease_journal import LeaseJournal
+
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.StrOpt('dhcp-journal-dir', default=None,
+               help='directory of the DHCP lease journal, use an absolute path; '
+                    'leases are restored from it on restart, unset to disable'),
+    cfg.ListOpt('dhcp-pools', default=['10.0.0.0/8'],
+                help='DHCP address pools, each cidr[;exclude;...][@dpid[:port]]; an exclude is an '
+                     'address, a cidr or first-last; pools scoped to a port, then to a switch, '
+                     'are used before unscoped ones'),
+    cfg.StrOpt('dhcp-addressing', default='pool', choices=['pool', 'switch'],
+               help='pool allocates from dhcp_pools, switch gives every switch its own address '
+                    'prefix, required by forwarding_mode=prefix')
+])
+
+
+class EventHostBulkAdd(EventBase):
+    """
+    一次加入多个主机，如重启后从租约日志恢复的所有主机
+    """
+
+    def __init__(self, hosts):
+        super(EventHostBulkAdd, self).__init__()
+        self.hosts = hosts
+
+
+class EventHostBulkDelete(EventBase):
+    """
+    一次删除多个主机，如同一次检查中租约到期的所有主机
+    """
+
+    def __init__(self, hosts):
+        super(EventHostBulkDelete, self).__init__()
+        self.hosts = hosts
+
 
 class DHCPResponder(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
     _EVENTS = [
         event.EventHostAdd,
-        event.EventHostDelete
+        event.EventHostDelete,
+        EventHostBulkAdd,
+        EventHostBulkDelete
     ]
 
     def __init__(self, *args, **kwargs):
@@ -28,37 +69,116 @@ class DHCPResponder(app_manager.RyuApp):
         self.release_time = 30
         self.hw_addr = '0a:e4:1c:d1:3e:44'
         self.dhcp_server = '10.0.0.1'
-        self.netmask = '255.0.0.0'
         self.dns = '8.8.8.8'
         self.bin_dns = addrconv.ipv4.text_to_bin(self.dns)
         self.hostname = 'dhcp'
-        self.bin_netmask = addrconv.ipv4.text_to_bin(self.netmask)
         self.bin_server = addrconv.ipv4.text_to_bin(self.dhcp_server)
-        self.ip_pool = {} #记录每个mac对应的ip，以及最近一次更新的时间
-        self.ip_addr = '10.0.0.'
-        self.usable_id = [i for i in range(2, 254)]
+        # 可分配的地址池，由配置项dhcp_pools指定，见lease.parse_pool；DHCP服务器自己的地址不分配
+        self.pools = [parse_pool(text, exclude=[self.dhcp_server]) for text in CONF.dhcp_pools]
+        self.leases = LeaseStore(self.pools, self.release_time) #记录每个mac对应的ip，以及最近一次更新的时间
+        # 地址分配方式：'pool'从self.pools中分配；'switch'为每台交换机划分一个连续的地址前缀，
+        # 主机从所连交换机的前缀中分配地址，拓扑模块的'prefix'转发模式据此按前缀聚合路由；由配置项dhcp_addressing指定
+        self.addressing = CONF.dhcp_addressing
+        self.switch_prefix_base = '10.0.0.0/8' #'switch'模式下划分交换机前缀的网段
+        self.switch_prefix_len = 24 #每台交换机的前缀长度，第dpid个前缀属于交换机dpid
+        self.switch_pools = {} #{dpid: AddressPool}，'switch'模式下已经建立的交换机地址池
+        self.reply_templates = {} #{(DHCP消息类型, 子网掩码): 回复报文模板}，见get_reply_template
+        self.punt_priority = 100 #把DHCP和ARP报文送到控制器的流表项的优先级，高于拓扑模块的路由流表项
+        self.miss_action = 'drop' #不匹配任何流表项的报文：'drop'丢弃，'flood'泛洪
+        self.proxy_arp = ProxyArp(self.get_mac_by_ip) #由租约回复ARP请求
+        self.arp_suppress_timeout = 0 #大于0时，回复ARP请求后在交换机上下发这么多秒的流表项丢弃重复请求
         self.mac_port = {} #记录每个mac对应的交换机端口以及交换机编号
+        self.lease_check_interval = 1 #检查租约到期的最长间隔(秒)
+        self.expiry_thread = None #检查租约到期的green thread，由start启动
+        # 租约日志的目录，由配置项dhcp_journal_dir指定，默认为None不记录租约，重启后所有主机重新分配地址；
+        # 需要时设为绝对路径，如'/var/lib/ryu/dhcp_leases'，相对路径取决于控制器启动时的工作目录
+        self.journal_dir = CONF.dhcp_journal_dir
+        self.journal_sync_interval = 1 #租约日志批量写入并fsync的周期(秒)
+        self.journal = None
+        self.journal_thread = None #定期写入租约日志的green thread，由start启动
+
+    def start(self):
+        thread = super(DHCPResponder, self).start()
+        if self.journal_dir:
+            self.restore_leases()
+            self.journal_thread = hub.spawn(self.journal_loop)
+        self.expiry_thread = hub.spawn(self.lease_expiry_loop)
+        return thread
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def restore_leases(self):
+        """
+        从租约日志恢复租约，并用一个EventHostBulkAdd把恢复的主机一起通知拓扑模块
+        """
+        start = time.time()
+        self.journal = LeaseJournal(self.journal_dir)
+        hosts = []
+        for mac, (ip, dpid, port, last_seen) in self.journal.load().items():
+            if self.addressing == 'switch':
+                self.get_switch_pool(self.switch_of_address(ip))
+            lease = self.leases.restore(mac, ip, dpid, port, last_seen)
+            if lease is None:
+                self.logger.warning('drop lease %s %s on %s:%s: address not in the pools of its port or switch, '
+                                    'or already taken', mac, ip, dpid, port)
+                continue
+            self.mac_port[mac] = [dpid, port]
+            h = switches.Host(mac, str(dpid)+":"+str(port))
+            h.ipv4.append(ip)
+            hosts.append(h)
+        self.journal.open()
+        self.journal.compact(self.leases)
+        self.leases.journal = self.journal
+        if hosts:
+            self.send_event_to_observers(EventHostBulkAdd(hosts))
+        self.logger.info('restored %d leases in %.3fs', len(hosts), time.time() - start)
+
+    def journal_loop(self):
+        """
+        定期把租约变化写入日志，日志过长时压缩成快照
+        """
+        while True:
+            hub.sleep(self.journal_sync_interval)
+            if self.journal.need_compact(len(self.leases)):
+                self.journal.compact(self.leases)
+            else:
+                self.journal.sync()
 
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
+        """
+        交换机只把DHCP和ARP报文完整地送到控制器，其余报文由拓扑模块下发的路由流表项转发，
+        都不匹配时按self.miss_action丢弃或泛洪，不再送到控制器
+        """
         datapath = ev.msg.datapath
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        # install table-miss flow entry
-        #
         # We specify NO BUFFER to max_len of the output action due to
         # OVS bug. At this moment, if we specify a lesser number, e.g.,
         # 128, OVS will send Packet-In with invalid buffer_id and
         # truncated packet data. In that case, we cannot output packets
         # correctly.  The bug has been fixed in OVS v2.1.0.
-        match = parser.OFPMatch()
         actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
                                           ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
+        for udp_port in (67, 68):
+            match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IP, ip_proto=in_proto.IPPROTO_UDP,
+                                    udp_dst=udp_port)
+            self.add_flow(datapath, self.punt_priority, match, actions)
+        match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_ARP)
+        self.add_flow(datapath, self.punt_priority, match, actions)
+
+        # install table-miss flow entry
+        match = parser.OFPMatch()
+        miss_actions = []
+        if self.miss_action == 'flood':
+            miss_actions = [parser.OFPActionOutput(ofproto.OFPP_FLOOD)]
+        self.add_flow(datapath, 0, match, miss_actions)
 
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None):
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None, hard_timeout=0):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
@@ -67,154 +187,146 @@ class DHCPResponder(app_manager.RyuApp):
         if buffer_id:
             mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
                                     priority=priority, match=match,
-                                    instructions=inst)
+                                    instructions=inst, hard_timeout=hard_timeout)
         else:
             mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
-                                    match=match, instructions=inst)
+                                    match=match, instructions=inst, hard_timeout=hard_timeout)
         datapath.send_msg(mod)
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
         msg = ev.msg
         datapath = msg.datapath
-        ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
         pkt = packet.Packet(data=msg.data)
-        pkt_udp = pkt.get_protocol(udp.udp)
         port = msg.match['in_port']
         pkt_arp = pkt.get_protocol(arp.arp)
         if pkt_arp:
-            self.arp_handle(ev)
-        if pkt_udp is None or udp.udp.get_packet_type(pkt_udp.src_port, pkt_udp.dst_port) != dhcp.dhcp:
+            self.arp_handle(ev, pkt)
             return
-        if msg.msg_len < msg.total_len:
-            # print("packet trucate %d of %d bytes" % (msg.msg_len, msg.total_len))
-            #通过截断包可以知道对应主机对应端口
-            actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER)]
-            out = parser.OFPPacketOut(datapath=datapath,
-                                      buffer_id=msg.buffer_id,
-                                      in_port=ofproto.OFPP_CONTROLLER,
-                                      actions=actions
-                                      )
-            self.mac_port[pkt.get_protocol(ethernet.ethernet).src] = [datapath.id, port]
-            datapath.send_msg(out)
-            return
-        pkt = packet.Packet(data=msg.data)
         pkt_dhcp = pkt.get_protocol(dhcp.dhcp)
-        smac = pkt.get_protocol(ethernet.ethernet).src
-        port = self.mac_port[smac][1]
-        if pkt_dhcp:
-            self._handle_dhcp(datapath, port, pkt)
+        if pkt_dhcp is None:
+            return
+        # DHCP报文只在主机所连的交换机上送到控制器，因此packet-in的端口就是主机所连的端口
+        self.mac_port[pkt.get_protocol(ethernet.ethernet).src] = [datapath.id, port]
+        self._handle_dhcp(datapath, port, pkt)
 
     def assemble_ack(self, pkt):
-        #self.semaphore.acquire()
-        #self.semaphore.release()
+        """
+        :return: DHCPACK报文的字节串，mac没有租约时返回None
+        """
         req_eth = pkt.get_protocol(ethernet.ethernet)
         req_ipv4 = pkt.get_protocol(ipv4.ipv4)
-        req_udp = pkt.get_protocol(udp.udp)
         req = pkt.get_protocol(dhcp.dhcp)
-        req.options.option_list.remove(
-            next(opt for opt in req.options.option_list if opt.tag == 53))
-        req.options.option_list.insert(
-            0, dhcp.option(tag=1, value=self.bin_netmask))
-        req.options.option_list.insert(
-            0, dhcp.option(tag=3, value=self.bin_server))
-        req.options.option_list.insert(
-            0, dhcp.option(tag=6, value=self.bin_dns))
-        # disc.options.option_list.insert(
-        #     0, dhcp.option(tag=12, value=self.hostname))
-        req.options.option_list.insert(
-            0, dhcp.option(tag=51, value=struct.pack('!I', self.release_time)))
-        req.options.option_list.insert(
-            0, dhcp.option(tag=53, value=struct.pack('!B', 5)))
-        # disc.options.option_list.insert(
-        #     0, dhcp.option(tag=54, value=self.hostname))
-        req.options.option_list.insert(
-            0, dhcp.option(tag=58, value=struct.pack('!I', self.release_time // 2)))
-        req.options.option_list.insert(
-            0, dhcp.option(tag=59, value=struct.pack('!I', self.release_time * 7 // 8)))
-        if req_eth.src not in self.ip_pool:
+        lease = self.leases.renew(req_eth.src, time.time())
+        if lease is None:
             return
-        # print(req_eth.src,end=" ")
-        # print(self.ip_pool[req_eth.src][2], time.perf_counter())
-        self.ip_pool[req_eth.src][1] = time.perf_counter()
-        ack_pkt = packet.Packet()
-        ack_pkt.add_protocol(ethernet.ethernet(
-            ethertype=req_eth.ethertype, dst=req_eth.src, src=self.hw_addr))
-        ack_pkt.add_protocol(
-            ipv4.ipv4(dst=req_ipv4.dst, src=self.dhcp_server, proto=req_ipv4.proto))
-        ack_pkt.add_protocol(udp.udp(src_port=67, dst_port=68))
-        ack_pkt.add_protocol(dhcp.dhcp(op=2, chaddr=req_eth.src,
-                                       siaddr=self.dhcp_server,
-                                       boot_file=req.boot_file,
-                                       yiaddr=self.ip_pool[req_eth.src][0],
-                                       xid=req.xid,
-                                       options=req.options))
-        self.host_check()
-        # self.logger.info("ASSEMBLED ACK: %s" % ack_pkt)
-        return ack_pkt
+        return self.build_reply(5, lease, req.xid, req_ipv4.dst)
 
     def assemble_offer(self, port, pkt):
-        #self.semaphore.acquire()
+        """
+        :return: DHCPOFFER报文的字节串，没有可分配的地址时返回None
+        """
         disc_eth = pkt.get_protocol(ethernet.ethernet)
         disc_ipv4 = pkt.get_protocol(ipv4.ipv4)
-        disc_udp = pkt.get_protocol(udp.udp)
         disc = pkt.get_protocol(dhcp.dhcp)
-        try:
-            disc.options.option_list.remove(
-                next(opt for opt in disc.options.option_list if opt.tag == 50))
-        except:
-            pass
-        disc.options.option_list.remove(
-            next(opt for opt in disc.options.option_list if opt.tag == 55))
-        disc.options.option_list.remove(
-            next(opt for opt in disc.options.option_list if opt.tag == 53))
-        disc.options.option_list.remove(
-            next(opt for opt in disc.options.option_list if opt.tag == 12))
-        disc.options.option_list.insert(
-            0, dhcp.option(tag=1, value=self.bin_netmask))
-        disc.options.option_list.insert(
-            0, dhcp.option(tag=3, value=self.bin_server))
-        disc.options.option_list.insert(
-            0, dhcp.option(tag=6, value=self.bin_dns))
-        # disc.options.option_list.insert(
-        #     0, dhcp.option(tag=12, value=self.hostname))
-        disc.options.option_list.insert(
-            0, dhcp.option(tag=51, value=struct.pack('!I', self.release_time)))
-        disc.options.option_list.insert(
-            0, dhcp.option(tag=53, value=struct.pack('!B', 2)))
-        # disc.options.option_list.insert(
-        #     0, dhcp.option(tag=54, value=self.hostname))
-        disc.options.option_list.insert(
-            0, dhcp.option(tag=58, value=struct.pack('!I', self.release_time // 2)))
-        disc.options.option_list.insert(
-            0, dhcp.option(tag=59, value=struct.pack('!I', self.release_time * 7 // 8)))
-        if disc_eth.src not in self.ip_pool:
-            nid = random.choice(self.usable_id)
-            nip = self.ip_addr + str(nid)
-            #print("new host in,mac:" + disc_eth.src + ",ip:" + nip)
-            self.usable_id.remove(nid)
-            self.ip_pool[disc_eth.src] = [nip, time.perf_counter()]
-        else:
-            self.ip_pool[disc_eth.src][1] = time.perf_counter()
-        #print(disc_eth.src, str(self.mac_port[disc_eth.src][1])+":"+str(self.mac_port[disc_eth.src][1]))
-        h = switches.Host(disc_eth.src, str(self.mac_port[disc_eth.src][0])+":"+str(self.mac_port[disc_eth.src][1]))
-        h.ipv4.append(self.ip_pool[disc_eth.src][0])
+        dpid, in_port = self.mac_port[disc_eth.src]
+        if self.addressing == 'switch':
+            self.get_switch_pool(dpid)
+        lease = self.leases.allocate(disc_eth.src, dpid, in_port, time.time(),
+                                     fallback=self.addressing != 'switch')
+        if lease is None:
+            self.logger.warning('no free address for %s', disc_eth.src)
+            return
+        h = switches.Host(disc_eth.src, str(dpid)+":"+str(in_port))
+        h.ipv4.append(lease.ip)
         self.send_event_to_observers(event.EventHostAdd(h))
-        nip = self.ip_pool[disc_eth.src][0]
-        offer_pkt = packet.Packet()
-        offer_pkt.add_protocol(ethernet.ethernet(
-            ethertype=disc_eth.ethertype, dst=disc_eth.src, src=self.hw_addr))
-        offer_pkt.add_protocol(
-            ipv4.ipv4(dst=disc_ipv4.dst, src=self.dhcp_server, proto=disc_ipv4.proto))
-        offer_pkt.add_protocol(udp.udp(src_port=67, dst_port=68))
-        offer_pkt.add_protocol(dhcp.dhcp(op=2, chaddr=disc_eth.src,
+        return self.build_reply(2, lease, disc.xid, disc_ipv4.dst)
+
+    def get_reply_template(self, msg_type, netmask):
+        """
+        DHCPOFFER和DHCPACK中除xid、chaddr、yiaddr和目的地址外的内容对所有主机都相同，
+        第一次用到时按消息类型和子网掩码组装一个完整的报文作为模板
+        :param msg_type: 2为DHCPOFFER，5为DHCPACK
+        :return: 模板报文的字节串
+        """
+        key = (msg_type, netmask)
+        template = self.reply_templates.get(key)
+        if template is None:
+            options = dhcp.options(option_list=[
+                dhcp.option(tag=59, value=struct.pack('!I', self.release_time * 7 // 8)),
+                dhcp.option(tag=58, value=struct.pack('!I', self.release_time // 2)),
+                dhcp.option(tag=53, value=struct.pack('!B', msg_type)),
+                dhcp.option(tag=51, value=struct.pack('!I', self.release_time)),
+                dhcp.option(tag=6, value=self.bin_dns),
+                dhcp.option(tag=3, value=self.bin_server),
+                dhcp.option(tag=1, value=addrconv.ipv4.text_to_bin(netmask))])
+            reply = packet.Packet()
+            reply.add_protocol(ethernet.ethernet(
+                ethertype=ether_types.ETH_TYPE_IP, dst='ff:ff:ff:ff:ff:ff', src=self.hw_addr))
+            reply.add_protocol(
+                ipv4.ipv4(dst='255.255.255.255', src=self.dhcp_server, proto=in_proto.IPPROTO_UDP))
+            reply.add_protocol(udp.udp(src_port=67, dst_port=68))
+            reply.add_protocol(dhcp.dhcp(op=2, chaddr='00:00:00:00:00:00',
                                          siaddr=self.dhcp_server,
-                                         boot_file=disc.boot_file,
-                                         yiaddr=nip,
-                                         xid=disc.xid,
-                                         options=disc.options))
-        return offer_pkt
+                                         yiaddr='0.0.0.0',
+                                         xid=0,
+                                         options=options))
+            reply.serialize()
+            template = self.reply_templates[key] = bytes(reply.data)
+        return template
+
+    def build_reply(self, msg_type, lease, xid, ip_dst):
+        """
+        在模板上填入本次回复的字段，重新计算IP首部校验和，UDP校验和置0(IPv4中表示不校验)
+        :return: 回复报文的字节串
+        """
+        buf = bytearray(self.get_reply_template(msg_type, lease.pool.netmask))
+        mac = addrconv.mac.text_to_bin(lease.mac)
+        buf[0:6] = mac                                              # 以太网目的地址
+        buf[30:34] = addrconv.ipv4.text_to_bin(ip_dst)              # IP目的地址
+        buf[24:26] = b'\x00\x00'
+        struct.pack_into('!H', buf, 24, packet_utils.checksum(buf[14:34]))
+        buf[40:42] = b'\x00\x00'                                    # UDP校验和
+        struct.pack_into('!I', buf, 46, xid)                        # xid
+        buf[58:62] = addrconv.ipv4.text_to_bin(lease.ip)            # yiaddr
+        buf[70:76] = mac                                            # chaddr
+        return bytes(buf)
+
+    def switch_prefix(self, dpid):
+        """
+        :return: 'switch'模式下交换机dpid拥有的地址前缀，如'10.0.1.0/24'；其他模式或dpid超出可划分的前缀个数时返回None
+        """
+        if self.addressing != 'switch':
+            return None
+        base, _ = parse_range(self.switch_prefix_base)
+        base_len = int(self.switch_prefix_base.split('/')[1])
+        if not 0 < dpid < 1 << (self.switch_prefix_len - base_len):
+            return None
+        return int_to_ip(base + (dpid << (32 - self.switch_prefix_len))) + '/' + str(self.switch_prefix_len)
+
+    def switch_of_address(self, ip):
+        """
+        :return: 'switch'模式下地址ip所在前缀所属的交换机dpid
+        """
+        base, _ = parse_range(self.switch_prefix_base)
+        return (ip_to_int(ip) - base) >> (32 - self.switch_prefix_len)
+
+    def get_switch_pool(self, dpid):
+        """
+        :return: 交换机dpid的地址池，第一次用到时建立；交换机没有前缀时返回None
+        """
+        pool = self.switch_pools.get(dpid)
+        if pool is None:
+            prefix = self.switch_prefix(dpid)
+            if prefix is None:
+                self.logger.warning('switch %s has no address prefix', dpid)
+                return None
+            # 通告整个网段的掩码，主机之间直接通过ARP(由代理ARP回复)通信，不经过网关
+            base = AddressPool(self.switch_prefix_base)
+            pool = AddressPool(prefix, exclude=[self.dhcp_server], scope=dpid, netmask=base.netmask)
+            self.switch_pools[dpid] = pool
+            self.leases.add_pool(pool)
+        return pool
 
     def get_state(self, pkt_dhcp):
         """
@@ -258,13 +370,18 @@ class DHCPResponder(app_manager.RyuApp):
             return
 
     def _send_packet(self, datapath, port, pkt):
+        """
+        :param pkt: packet.Packet或已经序列化的报文字节串
+        """
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         if pkt is None:
             return
-        pkt.serialize()
-        # print("packet-out %s" % (pkt,))
-        data = pkt.data
+        if isinstance(pkt, bytes):
+            data = pkt
+        else:
+            pkt.serialize()
+            data = pkt.data
         actions = [parser.OFPActionOutput(port=port)]
         out = parser.OFPPacketOut(datapath=datapath,
                                   buffer_id=ofproto.OFP_NO_BUFFER,
@@ -275,103 +392,74 @@ class DHCPResponder(app_manager.RyuApp):
 
 
 
-    # 定期检查超时未能更新的主机，删除之
+    def lease_expiry_loop(self):
+        """
+        定期释放超时未能更新的主机，睡眠到最早的租约到期，最长睡眠lease_check_interval秒
+        """
+        while True:
+            self.host_check()
+            next_expiry = self.leases.next_expiry()
+            delay = self.lease_check_interval
+            if next_expiry is not None:
+                delay = min(delay, max(next_expiry - time.time(), 0))
+            hub.sleep(delay)
+
+    # 删除超时未能更新的主机
     def host_check(self):
-        # while self.is_active:
-        #     self.check_event.clear()
-        for m in list(self.ip_pool.keys()):
-            if time.perf_counter() - self.ip_pool[m][1] > 30:
-                #print(time.perf_counter(), self.ip_pool[m][2])
-                id = int(self.ip_pool[m][0].split('.')[-1])
-                #print(m, str(self.mac_port[m][0])+":"+str(self.mac_port[m][1]))
-                h = switches.Host(m, str(self.mac_port[m][0])+":"+str(self.mac_port[m][1]))
-                h.ipv4.append(self.ip_pool[m][0])
-                self.send_event_to_observers(event.EventHostDelete(h))
-                del self.ip_pool[m]
-                del self.mac_port[m]
-                self.usable_id.append(id)
-            # self.check_event.wait(30)
-
-    def arp_handle(self, ev):
+        expired = self.leases.expire(time.time())
+        hosts = []
+        for lease in expired:
+            self.mac_port.pop(lease.mac, None)
+            h = switches.Host(lease.mac, str(lease.dpid)+":"+str(lease.port))
+            h.ipv4.append(lease.ip)
+            hosts.append(h)
+        # 同一次检查中到期的多个主机用一个EventHostBulkDelete通知，拓扑模块只重新计算一次
+        if len(hosts) == 1:
+            self.send_event_to_observers(event.EventHostDelete(hosts[0]))
+        elif hosts:
+            self.send_event_to_observers(EventHostBulkDelete(hosts))
+        return expired
+
+    def arp_handle(self, ev, pkt=None):
         """
         获取到源主机发送的ARP请求包，伪装成目的主机，给源主机发送ARP响应
+        目的地址未知、重复请求或端口超过速率时不回复，见proxy_arp.ProxyArp
         :param ev:
         :return:
         """
         msg = ev.msg
-        print("#############################################")
         datapath = msg.datapath
-        dpid = datapath.id
-
         port = msg.match['in_port']
-        pkt = packet.Packet(data=msg.data)
-        pkt_eth = pkt.get_protocol(ethernet.ethernet)
-        # if not pkt_eth:
-        #     print("packet-in: %s" % (pkt_eth,))
-        #     return
-        # else:
-        #     dst_mac = pkt_eth.dst
-        #     eth_type = pkt_eth.ethertype
-
-        # This 'if condition' is for learning the ip and mac addresses of hosts as well as .
+        if pkt is None:
+            pkt = packet.Packet(data=msg.data)
         pkt_arp = pkt.get_protocol(arp.arp)
-        if not pkt_arp:
+        if not pkt_arp or pkt_arp.opcode != arp.ARP_REQUEST:
             return
-        else:
-            print("datapath id: " + str(dpid))
-            print("port: " + str(port))
-
-            print("pkt_eth.dst: " + str(pkt_eth.dst))
-            print("pkt_eth.src: " + str(pkt_eth.src))
-            print("pkt_arp: " + str(pkt_arp))
-            print("pkt_arp:src_ip: " + str(pkt_arp.src_ip))
-            print("pkt_arp:dst_ip: " + str(pkt_arp.dst_ip))
-            print("pkt_arp:src_mac: " + str(pkt_arp.src_mac))
-            print("pkt_arp:dst_mac: " + str(pkt_arp.dst_mac))
-
-            # Destination and source ip address
-            dst_ip = pkt_arp.dst_ip
-            src_ip = pkt_arp.src_ip
-
-            # Destination and source mac address (HW address)
-            dst_mac = pkt_arp.dst_mac
-            src_mac = pkt_arp.src_mac
-            target_mac = self.get_mac_by_ip(dst_ip)     # 源主机希望获得的目的主机的mac
-            self._handle_arp(datapath, port, pkt_eth, pkt_arp, target_mac, dst_ip)
+        target_mac = self.proxy_arp.resolve(datapath.id, port, pkt_arp.src_mac, pkt_arp.dst_ip,
+                                            time.perf_counter())     # 源主机希望获得的目的主机的mac
+        if target_mac is None:
+            self.logger.debug('no arp reply for %s from %s', pkt_arp.dst_ip, pkt_arp.src_mac)
+            return
+        self._handle_arp(datapath, port, pkt_arp, target_mac, pkt_arp.dst_ip)
+        if self.arp_suppress_timeout:
+            self.suppress_arp(datapath, port, pkt_arp)
 
     def get_mac_by_ip(self, target_ip):
-        for item in self.ip_pool:
-            ip = self.ip_pool[item][0]
-            if ip == target_ip:
-                return item
+        return self.leases.get_mac_by_ip(target_ip)
 
-    def _handle_arp(self, datapath, port, pkt_ethernet, pkt_arp, target_hw_addr, target_ip_addr):
+    def _handle_arp(self, datapath, port, pkt_arp, target_hw_addr, target_ip_addr):
         """
         构造一个ARP响应包并发送给源主机
         :return:
         """
-        if pkt_arp.opcode != arp.ARP_REQUEST:
-            return
-        pkt = packet.Packet()
-        pkt.add_protocol(ethernet.ethernet(ethertype=pkt_ethernet.ethertype,
-                                           dst=pkt_ethernet.src,
-                                           src=target_hw_addr))
-        pkt.add_protocol(arp.arp(opcode=arp.ARP_REPLY,
-                                 src_mac=target_hw_addr,
-                                 src_ip=target_ip_addr,
-                                 dst_mac=pkt_arp.src_mac,
-                                 dst_ip=pkt_arp.src_ip))
-        self._send_packet(datapath, port, pkt)
+        self._send_packet(datapath, port,
+                          arp_reply(target_hw_addr, target_ip_addr, pkt_arp.src_mac, pkt_arp.src_ip))
 
-    def _send_packet(self, datapath, port, pkt):
-        ofproto = datapath.ofproto
+    def suppress_arp(self, datapath, port, pkt_arp):
+        """
+        已经回复的请求，在arp_suppress_timeout秒内由交换机直接丢弃同一主机对同一地址的重复请求，不再送到控制器
+        """
         parser = datapath.ofproto_parser
-        pkt.serialize()
-        data = pkt.data
-        actions = [parser.OFPActionOutput(port=port)]
-        out = parser.OFPPacketOut(datapath=datapath,
-                                  buffer_id=ofproto.OFP_NO_BUFFER,
-                                  in_port=ofproto.OFPP_CONTROLLER,
-                                  actions=actions,
-                                  data=data)
-        datapath.send_msg(out)
\ No newline at end of file
+        match = parser.OFPMatch(in_port=port, eth_type=ether_types.ETH_TYPE_ARP, arp_op=arp.ARP_REQUEST,
+                                arp_spa=pkt_arp.src_ip, arp_tpa=pkt_arp.dst_ip)
+        self.add_flow(datapath, self.punt_priority + 1, match, [], hard_timeout=self.arp_suppress_timeout)
@@ -0,0 +1,106 @@
+import numpy as np
+
+from ryu.topology.short_path import floyd_numpy, INF
+
+
+class DynamicShortPath(object):
+    """
+    动态维护全网最短路径：在已有的dis/path矩阵上处理单条链路的增加和删除，避免每次链路变化都重新运行floyd
+    dis、path的含义与short_path.floyd返回的完全相同：
+        dis[i][j]: 结点i到结点j的最短距离
+        path[i][j]: 从结点i到结点j的最短路径上j的前一个结点，path[i][i] = i，不可达时path[i][j] = i
+    链路按无向边处理，与Topo.getAdjMatrix一致
+    """
+
+    def __init__(self, n, dis, compute=floyd_numpy):
+        """
+        :param n: 交换机个数
+        :param dis: 邻接距离矩阵，不相连的结点之间为INF（即Topo.handle_matrix的返回值）
+        :param compute: 计算初始最短路径的函数，约定与floyd相同，如path_engine中引擎的compute
+        """
+        self.n = n
+        self.weight = np.array(dis, dtype=np.float64).reshape(n, n)  # 记录每条链路自身的权重
+        self.path, self.dis = compute(n, self.weight.copy())
+        self.path = np.array(self.path, dtype=np.int32)
+        self.dis = self.dis.astype(np.float64)
+
+    def add_edge(self, u, v, w=1):
+        """
+        增加(或缩短)链路u-v，复杂度O(n^2)
+        新的最短路径至多经过新链路一次，因此只需检查 i -> u -> v -> j 和 i -> v -> u -> j 两种情况
+        """
+        if u == v or w >= self.weight[u, v]:
+            return
+        self.weight[u, v] = self.weight[v, u] = w
+        self._insert_directed(u, v, w)
+        self._insert_directed(v, u, w)
+
+    def remove_edge(self, u, v):
+        """
+        删除链路u-v
+        """
+        self.update_edge(u, v, INF)
+
+    def update_edge(self, u, v, w):
+        """
+        把链路u-v的权重修改为w，w为INF表示删除该链路
+        权重减小时按加边处理；权重增大时，只有最短路径树(path的第i行)中包含该链路的源结点i会受影响，
+        只对这些行重新计算单源最短路径
+        """
+        if u == v:
+            return
+        old = self.weight[u, v]
+        if w < old:
+            self.add_edge(u, v, w)
+            return
+        if w == old:
+            return
+        affected = np.nonzero((self.path[:, v] == u) | (self.path[:, u] == v))[0]
+        self.weight[u, v] = self.weight[v, u] = w
+        for src in affected:
+            self._recompute_row(src)
+
+    def _insert_directed(self, u, v, w):
+        """
+        加入有向边u->v后，用 dis[i][u] + w + dis[v][j] 更新所有结点对
+        dis[i][u]和dis[v][j]都不会因为这条边而改变，所以可以一次性向量化完成
+        """
+        dis_iu = self.dis[:, u]
+        dis_vj = self.dis[v, :]
+        valid_iu = dis_iu != INF
+        valid_vj = dis_vj != INF
+        if not valid_iu.any() or not valid_vj.any():
+            return
+        through = dis_iu[:, np.newaxis] + w + dis_vj[np.newaxis, :]
+        better = (self.dis > through) & valid_iu[:, np.newaxis] & valid_vj[np.newaxis, :]
+        if not better.any():
+            return
+        # 经过u->v之后，j的前一个结点就是v到j的最短路径上j的前一个结点；j为v本身时，前一个结点为u
+        pred_v = self.path[v].copy()
+        pred_v[v] = u
+        rows, cols = np.nonzero(better)
+        self.dis[rows, cols] = through[rows, cols]
+        self.path[rows, cols] = pred_v[cols]
+
+    def _recompute_row(self, src):
+        """
+        在当前的链路权重上，用Dijkstra重新计算源结点src的一行dis和path
+        """
+        n = self.n
+        dis = np.full(n, INF, dtype=np.float64)
+        pred = np.full(n, src, dtype=np.int32)
+        done = np.zeros(n, dtype=bool)
+        dis[src] = 0
+        for _ in range(n):
+            candidate = np.where(done, np.inf, dis)
+            k = int(np.argmin(candidate))
+            if candidate[k] >= INF:
+                break
+            done[k] = True
+            weight_k = self.weight[k]
+            through = dis[k] + weight_k
+            better = (~done) & (weight_k != INF) & (through < dis)
+            dis[better] = through[better]
+            pred[better] = k
+        self.dis[src] = dis
+        self.path[src] = pred
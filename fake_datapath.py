@@ -0,0 +1,542 @@
+"""
+不需要Mininet和OVS的本地测试环境：用FakeDatapath代替交换机连接，记录控制器发出的每条OpenFlow消息及其序列化后的大小，
+并像交换机一样回复barrier、流表和组表查询；FakeNetwork把交换机、链路、主机事件和EventOFPPacketIn按顺序分发给
+Topo和DHCPResponder的事件处理函数，回放脚本化的场景(链路闪断、大量DHCP客户端启动、交换机离开等)，
+统计每一步的消息个数、字节数和从注入事件到所有计算、下发完成的时间
+
+    python -m ryu.topology.fake_datapath --scenario link_flap --topology grid
+    python -m ryu.topology.fake_datapath --scenario dhcp_boot --clients 1000
+    python -m ryu.topology.fake_datapath --script steps.json
+"""
+import argparse
+import collections
+import contextlib
+import inspect
+import json
+import os
+import struct
+import sys
+import time
+
+from ryu.controller import ofp_event
+from ryu.lib import hub
+from ryu.lib.packet import arp, dhcp, ethernet, ipv4, packet, udp
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+from ryu.topology import dhcps, event, switches
+from ryu.topology.benchmark import TOPOLOGIES, host_address
+from ryu.topology.topo_1 import Topo
+
+SETTLE_TIMEOUT = 60    # 一步操作之后等待所有事件处理、路径计算和流表下发完成的最长时间(秒)
+PORT_SPEED = 10000000  # 端口速率(kbit/s)，只用于构造OFPPort
+
+# OpenFlow消息类型 -> 名称，如14 -> 'OFPT_FLOW_MOD'
+MSG_NAMES = dict((value, name) for name, value in vars(ofproto_v1_3).items()
+                 if name.startswith('OFPT_') and isinstance(value, int))
+
+
+class MessageRecord(object):
+    """
+    控制器发给交换机的一条OpenFlow消息
+    """
+    __slots__ = ('dpid', 'msg_type', 'xid', 'size', 'time', 'buf')
+
+    def __init__(self, dpid, msg_type, xid, size, sent_at, buf):
+        self.dpid = dpid
+        self.msg_type = msg_type
+        self.xid = xid
+        self.size = size        # 序列化后的字节数
+        self.time = sent_at     # 发送时的time.perf_counter()
+        self.buf = buf
+
+
+class FakeDatapath(object):
+    """
+    代替ryu.controller.controller.Datapath：发送的消息照常序列化，记录下来而不写socket；
+    对FlowMod和GroupMod维护一份流表和组表，对barrier、流表查询和组表查询通过network回复
+    """
+
+    def __init__(self, dpid, network=None):
+        self.id = dpid
+        self.network = network
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.xid = 0
+        self.records = []
+        self.flows = {}     # {(table_id, priority, match的各项): OFPFlowStats}
+        self.groups = {}    # {group_id: OFPGroupDescStats}
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        self.send(msg.buf)
+
+    def send(self, buf):
+        """
+        buf中可以有多条消息，如FlowInstaller一次写入的一批消息
+        """
+        now = time.perf_counter()
+        offset = 0
+        while offset < len(buf):
+            _, msg_type, length, xid = struct.unpack_from('!BBHI', buf, offset)
+            data = bytes(buf[offset:offset + length])
+            self.records.append(MessageRecord(self.id, msg_type, xid, length, now, data))
+            self.handle(msg_type, xid, data)
+            offset += length
+
+    def handle(self, msg_type, xid, buf):
+        ofproto = self.ofproto
+        parser = self.ofproto_parser
+        if msg_type == ofproto.OFPT_FLOW_MOD:
+            self.apply_flow_mod(parser.OFPFlowMod.parser(self, ofproto.OFP_VERSION, msg_type, len(buf), xid, buf))
+        elif msg_type == ofproto.OFPT_GROUP_MOD:
+            self.apply_group_mod(buf)
+        elif msg_type == ofproto.OFPT_BARRIER_REQUEST:
+            reply = parser.OFPBarrierReply(self)
+            reply.xid = xid
+            self.reply(ofp_event.EventOFPBarrierReply(reply))
+        elif msg_type == ofproto.OFPT_MULTIPART_REQUEST:
+            stats_type = struct.unpack_from('!H', buf, ofproto.OFP_HEADER_SIZE)[0]
+            if stats_type == ofproto.OFPMP_FLOW:
+                reply = parser.OFPFlowStatsReply(self, body=list(self.flows.values()))
+                reply.flags = 0
+                self.reply(ofp_event.EventOFPFlowStatsReply(reply), xid)
+            elif stats_type == ofproto.OFPMP_GROUP_DESC:
+                reply = parser.OFPGroupDescStatsReply(self, body=list(self.groups.values()))
+                reply.flags = 0
+                self.reply(ofp_event.EventOFPGroupDescStatsReply(reply), xid)
+
+    def reply(self, ev, xid=None):
+        if xid is not None:
+            ev.msg.xid = xid
+        if self.network is not None:
+            self.network.publish(ev)
+
+    def apply_flow_mod(self, mod):
+        ofproto = self.ofproto
+        key = (mod.table_id, mod.priority, tuple(sorted(mod.match.items())))
+        if mod.command in (ofproto.OFPFC_ADD, ofproto.OFPFC_MODIFY_STRICT):
+            old = self.flows.get(key)
+            cookie = old.cookie if old is not None and mod.command == ofproto.OFPFC_MODIFY_STRICT else mod.cookie
+            if mod.command == ofproto.OFPFC_ADD or old is not None:
+                self.flows[key] = self.ofproto_parser.OFPFlowStats(
+                    mod.table_id, 0, 0, mod.priority, mod.idle_timeout, mod.hard_timeout, mod.flags,
+                    cookie, 0, 0, mod.match, mod.instructions)
+        elif mod.command == ofproto.OFPFC_DELETE_STRICT:
+            self.flows.pop(key, None)
+        elif mod.command == ofproto.OFPFC_DELETE:
+            items = set(mod.match.items())
+            for k, stat in list(self.flows.items()):
+                if (mod.table_id in (ofproto.OFPTT_ALL, k[0]) and items <= set(k[2])
+                        and stat.cookie & mod.cookie_mask == mod.cookie & mod.cookie_mask):
+                    del self.flows[k]
+
+    def apply_group_mod(self, buf):
+        ofproto = self.ofproto
+        parser = self.ofproto_parser
+        command, type_, group_id = struct.unpack_from('!HBxI', buf, ofproto.OFP_HEADER_SIZE)
+        if command == ofproto.OFPGC_DELETE:
+            self.groups.pop(group_id, None)
+            return
+        buckets = []
+        offset = ofproto.OFP_GROUP_MOD_SIZE
+        while offset < len(buf):
+            bucket = parser.OFPBucket.parser(buf, offset)
+            buckets.append(bucket)
+            offset += bucket.len
+        self.groups[group_id] = parser.OFPGroupDescStats(type_, group_id, buckets)
+
+
+class FakeNetwork(object):
+    """
+    用FakeDatapath组成的网络：按Ryu的方式把事件分发给各应用中用set_ev_cls声明的处理函数(不区分dispatcher)，
+    应用发出的事件(send_event_to_observers)和交换机的回复放入同一个队列按顺序处理
+    每一步操作之后调用settle，处理完队列中的事件，并等待各应用的RecomputeScheduler完成计算
+    """
+
+    def __init__(self, apps, quiet_window=None):
+        """
+        :param apps: 应用实例列表，如default_apps()的返回值
+        :param quiet_window: 不为None时替换各应用RecomputeScheduler的静默时间(秒)
+        """
+        self.apps = apps
+        self.handlers = {}          # {事件类: [(名称, 处理函数)]}
+        self.schedulers = []
+        for app in apps:
+            app.send_event_to_observers = self.publish
+            for name, method in inspect.getmembers(app, inspect.ismethod):
+                for ev_cls in getattr(method, 'callers', {}):
+                    self.handlers.setdefault(ev_cls, []).append(('%s.%s' % (app.name, name), method))
+            scheduler = getattr(app, 'recompute_scheduler', None)
+            if scheduler is not None:
+                if quiet_window is not None:
+                    scheduler.quiet_window = quiet_window
+                self.schedulers.append(scheduler)
+        self.queue = collections.deque()
+        self.datapaths = {}         # {dpid: FakeDatapath}
+        self.switches = {}          # {dpid: switches.Switch}
+        self.next_port = {}         # {dpid: 下一个未使用的端口号}
+        self.link_ports = {}        # {(dpid1, dpid2): (dpid1的端口, dpid2的端口)}
+        self.up_links = set()       # 连通的(dpid1, dpid2)，dpid1 < dpid2
+        self.hosts = {}             # {mac: (dpid, port_no, ip)}
+        self.handler_stats = {}     # {处理函数名称: [调用次数, 总耗时, 最长耗时]}
+        self.n_events = 0
+
+    # 事件分发
+
+    def publish(self, ev, state=None):
+        self.queue.append(ev)
+
+    def dispatch(self, ev):
+        self.n_events += 1
+        for name, handler in self.handlers.get(ev.__class__, ()):
+            start = time.perf_counter()
+            handler(ev)
+            elapsed = time.perf_counter() - start
+            stats = self.handler_stats.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+
+    def settle(self, timeout=SETTLE_TIMEOUT):
+        """
+        处理队列中的所有事件，并让出CPU给各应用的green thread，直到队列为空且没有等待中的路径计算
+        :return: 所用的时间(秒)
+        """
+        start = time.perf_counter()
+        while True:
+            while self.queue:
+                self.dispatch(self.queue.popleft())
+            hub.sleep(0)
+            if self.queue:
+                continue
+            if not any(scheduler.busy() for scheduler in self.schedulers):
+                break
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError('network did not settle in %s seconds' % timeout)
+            hub.sleep(0.001)
+        return time.perf_counter() - start
+
+    # 交换机、链路、主机和报文
+
+    def allocate_port(self, dpid):
+        port_no = self.next_port[dpid]
+        self.next_port[dpid] += 1
+        parser = ofproto_v1_3_parser
+        hw_addr = '00:00:%02x:%02x:%02x:%02x' % tuple(struct.pack('!HH', dpid & 0xffff, port_no))
+        ofpport = parser.OFPPort(port_no, hw_addr, ('s%d-eth%d' % (dpid, port_no)).encode(), 0, 0,
+                                 0, 0, 0, 0, PORT_SPEED, PORT_SPEED)
+        self.switches[dpid].add_port(ofpport)
+        return port_no
+
+    def get_port(self, dpid, port_no):
+        return next(port for port in self.switches[dpid].ports if port.port_no == port_no)
+
+    def add_switch(self, dpid):
+        """
+        交换机连接到控制器：先是features消息(DHCPResponder下发送到控制器的流表项)，然后是EventSwitchEnter
+        """
+        datapath = FakeDatapath(dpid, self)
+        self.datapaths[dpid] = datapath
+        self.switches[dpid] = switches.Switch(datapath)
+        self.next_port.setdefault(dpid, 1)
+        parser = datapath.ofproto_parser
+        features = parser.OFPSwitchFeatures(datapath, dpid, 0, 254, 0, 0)
+        self.publish(ofp_event.EventOFPSwitchFeatures(features))
+        self.publish(event.EventSwitchEnter(self.switches[dpid]))
+
+    def remove_switch(self, dpid):
+        """
+        与ryu.topology.switches相同，交换机断开时先删除它的所有链路，再发出EventSwitchLeave
+        """
+        for a, b in sorted(self.up_links):
+            if dpid in (a, b):
+                self.link_down(a, b)
+        self.publish(event.EventSwitchLeave(self.switches.pop(dpid)))   # datapath保留，已记录的消息仍计入统计
+
+    def link_up(self, dpid1, dpid2):
+        """
+        两台交换机之间的链路连通，第一次连通时为两端各分配一个端口，两个方向各发出一个EventLinkAdd
+        """
+        a, b = min(dpid1, dpid2), max(dpid1, dpid2)
+        if (a, b) in self.up_links:
+            return
+        if (a, b) not in self.link_ports:
+            self.link_ports[(a, b)] = (self.allocate_port(a), self.allocate_port(b))
+        port_a, port_b = self.link_ports[(a, b)]
+        src, dst = self.get_port(a, port_a), self.get_port(b, port_b)
+        self.up_links.add((a, b))
+        self.publish(event.EventLinkAdd(switches.Link(src, dst)))
+        self.publish(event.EventLinkAdd(switches.Link(dst, src)))
+
+    def link_down(self, dpid1, dpid2):
+        a, b = min(dpid1, dpid2), max(dpid1, dpid2)
+        if (a, b) not in self.up_links:
+            return
+        port_a, port_b = self.link_ports[(a, b)]
+        src, dst = self.get_port(a, port_a), self.get_port(b, port_b)
+        self.up_links.discard((a, b))
+        self.publish(event.EventLinkDelete(switches.Link(src, dst)))
+        self.publish(event.EventLinkDelete(switches.Link(dst, src)))
+
+    def attach_host(self, mac, dpid):
+        """
+        为主机在交换机dpid上分配一个端口，不发出事件；主机之后用DHCP获得地址
+        :return: 端口号
+        """
+        host = self.hosts.get(mac)
+        if host is not None:
+            return host[1]
+        port_no = self.allocate_port(dpid)
+        self.hosts[mac] = (dpid, port_no, None)
+        return port_no
+
+    def add_host(self, mac, dpid, ip):
+        """
+        直接发出EventHostAdd，不经过DHCP
+        """
+        port_no = self.attach_host(mac, dpid)
+        self.hosts[mac] = (dpid, port_no, ip)
+        host = switches.Host(mac, '%d:%d' % (dpid, port_no))
+        host.ipv4.append(ip)
+        self.publish(event.EventHostAdd(host))
+
+    def remove_host(self, mac):
+        dpid, port_no, ip = self.hosts.pop(mac)
+        host = switches.Host(mac, '%d:%d' % (dpid, port_no))
+        host.ipv4.append(ip)
+        self.publish(event.EventHostDelete(host))
+
+    def packet_in(self, dpid, port_no, data):
+        """
+        注入交换机送到控制器的一个报文
+        """
+        datapath = self.datapaths[dpid]
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        msg = parser.OFPPacketIn(datapath, ofproto.OFP_NO_BUFFER, len(data), ofproto.OFPR_ACTION, 0, 0,
+                                 parser.OFPMatch(in_port=port_no), data)
+        self.publish(ofp_event.EventOFPPacketIn(msg))
+
+    def dhcp_discover(self, mac, dpid, xid=1):
+        self.packet_in(dpid, self.attach_host(mac, dpid), dhcp_packet(mac, dhcp.DHCP_DISCOVER, xid))
+
+    def dhcp_request(self, mac, xid=1):
+        dpid, port_no, _ = self.hosts[mac]
+        self.packet_in(dpid, port_no, dhcp_packet(mac, dhcp.DHCP_REQUEST, xid))
+
+    def arp_request(self, mac, src_ip, target_ip):
+        dpid, port_no, _ = self.hosts[mac]
+        self.packet_in(dpid, port_no, arp_packet(mac, src_ip, target_ip))
+
+    # 统计
+
+    def messages(self):
+        """
+        :return: 所有交换机上记录的消息，按发送顺序
+        """
+        records = [record for datapath in self.datapaths.values() for record in datapath.records]
+        records.sort(key=lambda record: record.time)
+        return records
+
+    def reset_stats(self):
+        for datapath in self.datapaths.values():
+            datapath.records = []
+        self.handler_stats = {}
+        self.n_events = 0
+
+    def stats(self):
+        """
+        :return: 从上次reset_stats以来的消息个数、字节数(按消息类型分别统计)、事件个数和每个处理函数的耗时
+        """
+        by_type = {}
+        for datapath in self.datapaths.values():
+            for record in datapath.records:
+                item = by_type.setdefault(MSG_NAMES.get(record.msg_type, str(record.msg_type)), [0, 0])
+                item[0] += 1
+                item[1] += record.size
+        return {
+            'events': self.n_events,
+            'messages': sum(count for count, _ in by_type.values()),
+            'bytes': sum(size for _, size in by_type.values()),
+            'by_type': by_type,
+            'handlers': dict((name, {'calls': calls, 'total': round(total, 6), 'max': round(longest, 6)})
+                             for name, (calls, total, longest) in self.handler_stats.items()),
+        }
+
+
+def dhcp_packet(mac, msg_type, xid):
+    """
+    :return: 客户端广播的DHCP报文(DHCPDISCOVER或DHCPREQUEST)的字节串
+    """
+    options = dhcp.options(option_list=[dhcp.option(tag=dhcp.DHCP_MESSAGE_TYPE_OPT, value=struct.pack('!B', msg_type))])
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src=mac))
+    pkt.add_protocol(ipv4.ipv4(dst='255.255.255.255', src='0.0.0.0', proto=17))
+    pkt.add_protocol(udp.udp(src_port=68, dst_port=67))
+    pkt.add_protocol(dhcp.dhcp(op=dhcp.DHCP_BOOT_REQUEST, chaddr=mac, xid=xid, options=options))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def arp_packet(mac, src_ip, target_ip):
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src=mac, ethertype=0x0806))
+    pkt.add_protocol(arp.arp(opcode=arp.ARP_REQUEST, src_mac=mac, src_ip=src_ip,
+                             dst_mac='00:00:00:00:00:00', dst_ip=target_ip))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def default_apps(forwarding_mode='tree'):
+    """
+    :return: [DHCPResponder, Topo]，不调用start，因此不恢复也不记录租约日志；不请求端口统计
+    """
+    dhcp_app = dhcps.DHCPResponder()
+    if forwarding_mode == 'prefix':
+        dhcp_app.addressing = 'switch'
+    topo = Topo(dhcp=dhcp_app)
+    topo.forwarding_mode = forwarding_mode
+    return [dhcp_app, topo]
+
+
+def replay(network, script):
+    """
+    依次执行脚本中的每一步，每一步之后等待网络稳定
+    :param script: [{'name': 步骤名称, 'actions': [[FakeNetwork的方法名, 参数...], ...]}, ...]，可以从JSON文件读入
+    :return: 每一步的统计，见FakeNetwork.stats，另有'step'和'latency'(注入事件到网络稳定的时间，秒)
+    """
+    results = []
+    for step in script:
+        network.reset_stats()
+        start = time.perf_counter()
+        for action in step['actions']:
+            getattr(network, action[0])(*action[1:])
+        network.settle()
+        result = network.stats()
+        result['step'] = step['name']
+        result['latency'] = round(time.perf_counter() - start, 6)
+        results.append(result)
+    return results
+
+
+def setup_script(topology, params, hosts_per_switch=None):
+    """
+    建立拓扑的步骤：所有交换机连接、所有链路连通，再加入主机
+    :return: (脚本, 链路列表, 连接主机的交换机列表)
+    """
+    n_switches, edges, edge_switches, default_hosts = TOPOLOGIES[topology](**params)
+    if hosts_per_switch is None:
+        hosts_per_switch = default_hosts
+    script = [
+        {'name': 'switches enter', 'actions': [['add_switch', dpid] for dpid in range(1, n_switches + 1)]},
+        {'name': 'links up', 'actions': [['link_up', a, b] for a, b in edges]},
+    ]
+    hosts = []
+    index = 1
+    for dpid in edge_switches:
+        for _ in range(hosts_per_switch):
+            mac, ip = host_address(index)
+            hosts.append(['add_host', mac, dpid, ip])
+            index += 1
+    if hosts:
+        script.append({'name': 'hosts add', 'actions': hosts})
+    return script, edges, edge_switches
+
+
+def link_flap(topology, params, hosts_per_switch=None, flaps=1):
+    """
+    链路闪断：拓扑建立后，第一条链路断开再恢复flaps次
+    """
+    script, edges, _ = setup_script(topology, params, hosts_per_switch)
+    a, b = edges[0]
+    for i in range(flaps):
+        script.append({'name': 'link down %d' % i, 'actions': [['link_down', a, b]]})
+        script.append({'name': 'link up %d' % i, 'actions': [['link_up', a, b]]})
+    return script
+
+
+def dhcp_boot(topology, params, clients=1000):
+    """
+    DHCP客户端启动：拓扑建立后(没有主机)，clients台主机轮流连接在各边缘交换机上，
+    同时发出DHCPDISCOVER，收到回复后再同时发出DHCPREQUEST
+    """
+    script, _, edge_switches = setup_script(topology, params, 0)
+    macs = ['02:01:%02x:%02x:%02x:%02x' % tuple(struct.pack('!I', i)) for i in range(1, clients + 1)]
+    script.append({'name': 'dhcp discover', 'actions': [
+        ['dhcp_discover', mac, edge_switches[i % len(edge_switches)], i] for i, mac in enumerate(macs)]})
+    script.append({'name': 'dhcp request', 'actions': [['dhcp_request', mac, i] for i, mac in enumerate(macs)]})
+    return script
+
+
+def switch_leave(topology, params, hosts_per_switch=None):
+    """
+    交换机离开：拓扑建立后，一台不连接主机的交换机(如核心或spine交换机)断开，没有时断开编号最大的交换机
+    """
+    script, edges, edge_switches = setup_script(topology, params, hosts_per_switch)
+    n_switches = TOPOLOGIES[topology](**params)[0]
+    inner = [dpid for dpid in range(1, n_switches + 1) if dpid not in set(edge_switches)]
+    script.append({'name': 'switch leave', 'actions': [['remove_switch', inner[0] if inner else n_switches]]})
+    return script
+
+
+SCENARIOS = {
+    'link_flap': link_flap,
+    'dhcp_boot': dhcp_boot,
+    'switch_leave': switch_leave,
+}
+
+# 各种拓扑在命令行中没有给出参数时使用的参数
+DEFAULT_PARAMS = {
+    'fat_tree': {'k': 4},
+    'leaf_spine': {'spines': 4, 'leaves': 16},
+    'grid': {'rows': 4, 'cols': 4},
+    'random': {'n': 32, 'degree': 3},
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='replay scenarios against fake datapaths')
+    parser.add_argument('--scenario', default='link_flap', choices=sorted(SCENARIOS))
+    parser.add_argument('--script', help='JSON file with the steps to replay, instead of --scenario')
+    parser.add_argument('--topology', default='leaf_spine', choices=sorted(TOPOLOGIES))
+    parser.add_argument('--params', help='topology parameters as JSON, e.g. {"k": 8}')
+    parser.add_argument('--mode', default='tree', help='forwarding mode of the topology app')
+    parser.add_argument('--clients', type=int, default=1000, help='number of clients for dhcp_boot')
+    parser.add_argument('--quiet-window', type=float, default=0.0,
+                        help='recompute quiet window in seconds (the app default batches for 1s)')
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    if args.script:
+        name = os.path.basename(args.script)
+        with open(args.script) as f:
+            script = json.load(f)
+    else:
+        name = args.scenario
+        params = json.loads(args.params) if args.params else DEFAULT_PARAMS[args.topology]
+        if args.scenario == 'dhcp_boot':
+            script = dhcp_boot(args.topology, params, args.clients)
+        else:
+            script = SCENARIOS[args.scenario](args.topology, params)
+    network = FakeNetwork(default_apps(args.mode), args.quiet_window)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):   # 各应用逐条打印事件
+        results = replay(network, script)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in results:
+            result['scenario'] = name
+            out.write(json.dumps(result, sort_keys=True) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
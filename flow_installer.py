@@ -0,0 +1,138 @@
+import logging
+import time
+
+from ryu.lib import hub
+
+BATCH_SIZE = 256  # 每批最多下发的消息个数，每批之后跟一个OFPBarrierRequest
+
+
+class RouteUpdate(object):
+    """
+    一次路由更新：记录这次更新中发出的所有OFPBarrierRequest，全部收到OFPBarrierReply后，
+    说明所有交换机都已经处理完这次更新的消息
+    """
+
+    def __init__(self):
+        self.pending = set()      # 还没有收到回复的barrier {(dpid, xid)}
+        self.n_msgs = 0           # 本次更新下发的消息个数(不含barrier)
+        self.n_barriers = 0
+        self.start = time.time()
+        self.end = None
+        self.event = hub.Event()
+
+    def done(self):
+        return self.end is not None
+
+    def wait(self, timeout=None):
+        """
+        等待所有交换机确认本次更新
+        :return: 是否在timeout秒内全部确认
+        """
+        return self.event.wait(timeout)
+
+    def convergence_time(self):
+        """
+        :return: 从开始下发到所有交换机确认所用的时间(秒)，还没有全部确认时返回None
+        """
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def finish(self):
+        self.end = time.time()
+        self.event.set()
+
+
+class FlowInstaller(object):
+    """
+    按交换机缓存要下发的OpenFlow消息，flush时每台交换机每批消息只写一次socket，并在每批之后插入OFPBarrierRequest，
+    由barrier的回复判断交换机何时处理完这次更新
+    """
+    BARRIER = 'barrier'   # 队列中的分隔标记：之前的消息处理完之后才处理之后的消息
+
+    def __init__(self, batch_size=BATCH_SIZE, logger=None):
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.queues = {}     # {dpid: (datapath, [消息或BARRIER])}
+        self.pending = {}    # {(dpid, xid): RouteUpdate}
+
+    def send(self, datapath, msg):
+        """
+        把一条消息放入datapath的发送队列，flush时才真正发送
+        """
+        self.queues.setdefault(datapath.id, (datapath, []))[1].append(msg)
+
+    def barrier(self, datapath):
+        """
+        在datapath的发送队列中插入一个分隔，保证交换机处理完之前的消息后才处理之后的消息，如先增加后删除
+        """
+        queue = self.queues.get(datapath.id)
+        if queue is not None and queue[1] and queue[1][-1] is not self.BARRIER:
+            queue[1].append(self.BARRIER)
+
+    def flush(self, update=None):
+        """
+        发送所有队列中的消息
+        :param update: 分批发送一次更新时，传入前几批返回的RouteUpdate，这批消息也计入其中
+        :return: RouteUpdate，所有交换机都确认后触发
+        """
+        if update is None:
+            update = RouteUpdate()
+        queues = self.queues
+        self.queues = {}
+        for datapath, msgs in queues.values():
+            batch = []
+            for msg in msgs:
+                if msg is self.BARRIER or len(batch) >= self.batch_size:
+                    self._send_batch(datapath, batch, update)
+                    batch = []
+                if msg is not self.BARRIER:
+                    batch.append(msg)
+            self._send_batch(datapath, batch, update)
+        if not update.pending and not update.done():
+            update.finish()
+        return update
+
+    def _send_batch(self, datapath, batch, update):
+        if not batch:
+            return
+        parser = datapath.ofproto_parser
+        barrier = parser.OFPBarrierRequest(datapath)
+        bufs = []
+        for msg in batch + [barrier]:
+            if msg.xid is None:
+                datapath.set_xid(msg)
+            msg.serialize()
+            bufs.append(msg.buf)
+        datapath.send(b''.join(bufs))
+        key = (datapath.id, barrier.xid)
+        self.pending[key] = update
+        update.pending.add(key)
+        update.n_msgs += len(batch)
+        update.n_barriers += 1
+
+    def barrier_reply(self, dpid, xid):
+        """
+        收到交换机的OFPBarrierReply
+        :return: 若因此完成了一次更新，返回该RouteUpdate，否则返回None
+        """
+        update = self.pending.pop((dpid, xid), None)
+        if update is None:
+            return None
+        update.pending.discard((dpid, xid))
+        if not update.pending and not update.done():
+            update.finish()
+            return update
+        return None
+
+    def datapath_gone(self, dpid):
+        """
+        交换机断开连接，不再等待它的barrier回复
+        :return: 因此完成的RouteUpdate列表
+        """
+        finished = []
+        for key in [key for key in self.pending if key[0] == dpid]:
+            update = self.barrier_reply(*key)
+            if update is not None:
+                finished.append(update)
+        return finished
@@ -0,0 +1,90 @@
+ROUTE_COOKIE = 0x746f706f  # 拓扑模块下发的路由流表项的cookie，交换机重连时只查询这些流表项
+
+
+def flow_key(priority, **fields):
+    """
+    控制器记录下发到每台交换机的流表项，重新计算路径后只下发有变化的部分，流表项统一表示为：
+        键: (priority, ((match字段, 值), ...))，match字段按名称排序，与OpenFlow中严格匹配的条件一致
+        动作: ((动作类型, 参数), ...)，如(('output', 2),)，空元组表示丢弃
+    :param priority: 流表项的优先级
+    :param fields: OFPMatch的匹配字段，如ipv4_dst='10.0.0.2', in_port=1
+    :return: 流表项的键
+    """
+    return priority, tuple(sorted(fields.items()))
+
+
+def diff_flows(installed, desired):
+    """
+    比较一台交换机上已经下发的流表项和希望下发的流表项
+    :param installed: {键: 动作}，已经下发的流表项
+    :param desired: {键: 动作}，希望下发的流表项
+    :return: (adds, modifies, deletes)
+        adds: [(键, 动作)]，需要新增的流表项
+        modifies: [(键, 动作)]，匹配条件相同但动作不同，需要修改的流表项
+        deletes: [键]，需要删除的流表项
+    """
+    adds = []
+    modifies = []
+    for key, actions in desired.items():
+        old = installed.get(key)
+        if old is None:
+            adds.append((key, actions))
+        elif old != actions:
+            modifies.append((key, actions))
+    deletes = [key for key in installed if key not in desired]
+    return adds, modifies, deletes
+
+
+def to_match(parser, key):
+    """
+    由流表项的键构造OFPMatch
+    """
+    return parser.OFPMatch(**dict(key[1]))
+
+
+def to_actions(parser, actions):
+    """
+    由流表项的动作构造OpenFlow的动作列表
+    """
+    result = []
+    for action, arg in actions:
+        if action == 'output':
+            result.append(parser.OFPActionOutput(arg))
+        elif action == 'group':
+            result.append(parser.OFPActionGroup(arg))
+        else:
+            raise ValueError('unknown action: {0}'.format(action))
+    return result
+
+
+def flow_from_stats(ofproto, stat):
+    """
+    由交换机回复的OFPFlowStats得到flow_table中的表示，用于与希望下发的流表项比较
+    :return: (键, 动作)
+    """
+    key = (stat.priority, tuple(sorted(stat.match.items())))
+    actions = []
+    for inst in stat.instructions:
+        if inst.type != ofproto.OFPIT_APPLY_ACTIONS:
+            continue
+        for action in inst.actions:
+            if action.type == ofproto.OFPAT_OUTPUT:
+                actions.append(('output', action.port))
+            elif action.type == ofproto.OFPAT_GROUP:
+                actions.append(('group', action.group_id))
+            else:
+                actions.append((action.__class__.__name__, None))   # 控制器不会下发的动作，比较时总是不同
+    return key, tuple(actions)
+
+
+def group_from_stats(ofproto, desc):
+    """
+    由交换机回复的OFPGroupDescStats得到组表的表示
+    :return: (group_id, (出端口, ...))
+    """
+    ports = []
+    for bucket in desc.buckets:
+        for action in bucket.actions:
+            if action.type == ofproto.OFPAT_OUTPUT:
+                ports.append(action.port)
+    return desc.group_id, tuple(sorted(ports))
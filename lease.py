@@ -0,0 +1,338 @@
+import heapq
+import itertools
+import socket
+import struct
+from array import array
+
+
+def ip_to_int(ip):
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def int_to_ip(n):
+    return socket.inet_ntoa(struct.pack('!I', n))
+
+
+def parse_range(text):
+    """
+    :param text: 'a.b.c.d'、'a.b.c.d/n'或'a.b.c.d-e.f.g.h'
+    :return: (第一个地址, 最后一个地址)，均为整数
+    """
+    if '-' in text:
+        first, last = text.split('-')
+        return ip_to_int(first.strip()), ip_to_int(last.strip())
+    if '/' in text:
+        ip, prefix_len = text.split('/')
+        mask = (0xffffffff << (32 - int(prefix_len))) & 0xffffffff
+        first = ip_to_int(ip) & mask
+        return first, first | (~mask & 0xffffffff)
+    n = ip_to_int(text)
+    return n, n
+
+
+def parse_pool(text, exclude=()):
+    """
+    解析地址池的配置'网段[;排除的地址;...][@dpid[:端口]]'，如'10.1.0.0/16;10.1.0.1-10.1.0.9@3:1'
+    排除的地址与AddressPool的exclude相同，@之后为地址池的范围，没有时为所有主机
+    :param exclude: 另外要排除的地址，如DHCP服务器自己的地址
+    :return: AddressPool
+    """
+    spec = text.strip()
+    scope = None
+    if '@' in spec:
+        spec, scope_text = spec.split('@', 1)
+        if ':' in scope_text:
+            dpid, port = scope_text.split(':', 1)
+            scope = (int(dpid, 0), int(port))
+        else:
+            scope = int(scope_text, 0)
+    items = [item.strip() for item in spec.split(';') if item.strip()]
+    if not items or '/' not in items[0]:
+        raise ValueError('bad address pool %r, expected cidr[;exclude;...][@dpid[:port]]' % text)
+    return AddressPool(items[0], exclude=items[1:] + list(exclude), scope=scope)
+
+
+class Lease(object):
+    """
+    一个主机的DHCP租约
+    """
+    __slots__ = ('mac', 'ip', 'dpid', 'port', 'last_seen', 'pool')
+
+    def __init__(self, mac, ip, dpid, port, last_seen, pool):
+        """
+        :param mac: 主机的mac地址
+        :param ip: 分配给主机的ip地址
+        :param dpid: 主机所连交换机的编号
+        :param port: 主机所连交换机的端口
+        :param last_seen: 最近一次更新租约的时间
+        :param pool: 分配该地址的AddressPool
+        """
+        self.mac = mac
+        self.ip = ip
+        self.dpid = dpid
+        self.port = port
+        self.last_seen = last_seen
+        self.pool = pool
+
+
+class AddressPool(object):
+    """
+    一个CIDR网段中可分配的地址：除去网络地址、广播地址和排除的地址后，剩余的地址保存为若干个整数区间，
+    从未分配过的地址用区间和游标表示，释放的地址放入整数数组，不为每个地址创建Python对象，分配和释放都是O(1)
+    """
+
+    def __init__(self, cidr, exclude=(), scope=None, netmask=None):
+        """
+        :param cidr: 网段，如'10.0.0.0/8'
+        :param exclude: 不分配的地址，每项可以是单个地址、CIDR或'起始地址-结束地址'
+        :param scope: 只为连接在该交换机上的主机分配地址：None表示所有主机，dpid表示一台交换机，
+                      (dpid, port_no)表示交换机的一个端口
+        :param netmask: 通告给主机的子网掩码，默认为cidr的掩码
+        """
+        self.cidr = cidr
+        self.scope = scope
+        self.prefix_len = int(cidr.split('/')[1])
+        self.network, self.broadcast = parse_range(cidr)
+        self.netmask = netmask or int_to_ip((0xffffffff << (32 - self.prefix_len)) & 0xffffffff)
+        first, last = self.network, self.broadcast
+        if self.prefix_len < 31:
+            first, last = first + 1, last - 1
+        ranges = [(first, last + 1)]           # 左闭右开区间
+        for text in exclude:
+            ex_first, ex_last = parse_range(text)
+            split = []
+            for start, end in ranges:
+                if ex_last < start or ex_first >= end:
+                    split.append((start, end))
+                    continue
+                if start < ex_first:
+                    split.append((start, ex_first))
+                if ex_last + 1 < end:
+                    split.append((ex_last + 1, end))
+            ranges = split
+        self.ranges = ranges
+        self.size = sum(end - start for start, end in ranges)
+        self.range_index = 0                   # 游标所在的区间
+        self.cursor = ranges[0][0] if ranges else 0
+        self.released = array('I')             # 释放后可以重新分配的地址
+        self.skip = set()                      # 游标之后已经被reserve占用的地址，游标经过时跳过
+        self.n_allocated = 0
+
+    def __contains__(self, n):
+        return self.network <= n <= self.broadcast
+
+    def available(self):
+        return self.size - self.n_allocated
+
+    def allocate(self):
+        """
+        优先分配从未用过的地址，用完后再分配释放的地址
+        :return: 整数地址，没有可用地址时返回None
+        """
+        while self.range_index < len(self.ranges):
+            end = self.ranges[self.range_index][1]
+            while self.cursor < end:
+                n = self.cursor
+                self.cursor += 1
+                if self.skip and n in self.skip:
+                    self.skip.discard(n)
+                    continue
+                self.n_allocated += 1
+                return n
+            self.range_index += 1
+            if self.range_index < len(self.ranges):
+                self.cursor = self.ranges[self.range_index][0]
+        if self.released:
+            self.n_allocated += 1
+            return self.released.pop()
+        return None
+
+    def release(self, n):
+        self.released.append(n)
+        self.n_allocated -= 1
+
+    def reserve(self, n):
+        """
+        占用指定的地址，用于从租约日志恢复租约
+        :return: 地址可以分配且未被占用时返回True
+        """
+        if self.range_index < len(self.ranges) and n == self.cursor < self.ranges[self.range_index][1] \
+                and n not in self.skip:
+            self.cursor += 1        # 快照中的租约大致按地址顺序排列，多数地址正好在游标处
+            self.n_allocated += 1
+            return True
+        for i, (start, end) in enumerate(self.ranges):
+            if start <= n < end:
+                break
+        else:
+            return False
+        if i > self.range_index or (i == self.range_index and n >= self.cursor):
+            if n in self.skip:
+                return False
+            self.skip.add(n)
+        else:
+            try:
+                index = self.released.index(n)
+            except ValueError:
+                return False
+            self.released[index] = self.released[-1]
+            self.released.pop()
+        self.n_allocated += 1
+        return True
+
+
+class LeaseStore(object):
+    """
+    DHCP租约库：按mac和ip建立索引，分配、释放地址以及按mac或ip查找租约都是O(1)
+    地址从若干个AddressPool中分配，主机所连端口的地址池优先，其次是所连交换机的地址池，最后是不限范围的地址池
+    租约按到期时间放入最小堆，续租只更新last_seen，到期检查时才把续过租的租约按新的到期时间放回堆中，
+    因此每个租约在堆中只有一项，过期一个租约的代价为O(log n)
+    """
+
+    def __init__(self, pools, lease_time, journal=None):
+        """
+        :param pools: AddressPool列表，同一范围内的地址池按列表顺序使用
+        :param lease_time: 租期(秒)，超过租期没有续租的租约会被expire释放
+        :param journal: 记录租约变化的lease_journal.LeaseJournal，为None时不记录
+        """
+        self.lease_time = lease_time
+        self.journal = journal
+        self.pools = {}        # {scope: [AddressPool]}
+        for pool in pools:
+            self.add_pool(pool)
+        self.by_mac = {}       # {mac: Lease}
+        self.mac_by_ip = {}    # {ip: mac}
+        self.expiry_heap = []  # [(到期时间, 序号, Lease)]，序号用于到期时间相同时比较
+        self.seq = itertools.count()
+
+    def __len__(self):
+        return len(self.by_mac)
+
+    def __contains__(self, mac):
+        return mac in self.by_mac
+
+    def __iter__(self):
+        return iter(list(self.by_mac.values()))
+
+    def add_pool(self, pool):
+        self.pools.setdefault(pool.scope, []).append(pool)
+
+    def allocate_address(self, dpid, port, fallback=True):
+        """
+        :param fallback: 主机所连端口和交换机的地址池都没有可用地址时，是否从不限范围的地址池中分配
+        :return: (整数地址, AddressPool)，没有可用地址时返回(None, None)
+        """
+        scopes = ((dpid, port), dpid, None) if fallback else ((dpid, port), dpid)
+        for scope in scopes:
+            for pool in self.pools.get(scope, ()):
+                n = pool.allocate()
+                if n is not None:
+                    return n, pool
+        return None, None
+
+    def get(self, mac):
+        return self.by_mac.get(mac)
+
+    def get_mac_by_ip(self, ip):
+        return self.mac_by_ip.get(ip)
+
+    def allocate(self, mac, dpid, port, now, fallback=True):
+        """
+        为mac分配地址，mac已有租约时只更新租约
+        :param fallback: 见allocate_address
+        :return: Lease，地址已经分配完时返回None
+        """
+        lease = self.by_mac.get(mac)
+        if lease is not None:
+            lease.dpid = dpid
+            lease.port = port
+            lease.last_seen = now
+            if self.journal is not None:
+                self.journal.add(lease)
+            return lease
+        n, pool = self.allocate_address(dpid, port, fallback)
+        if n is None:
+            return None
+        ip = int_to_ip(n)
+        lease = Lease(mac, ip, dpid, port, now, pool)
+        self.insert(lease)
+        if self.journal is not None:
+            self.journal.add(lease)
+        return lease
+
+    def insert(self, lease):
+        self.by_mac[lease.mac] = lease
+        self.mac_by_ip[lease.ip] = lease.mac
+        heapq.heappush(self.expiry_heap, (lease.last_seen + self.lease_time, next(self.seq), lease))
+
+    def restore(self, mac, ip, dpid, port, last_seen):
+        """
+        恢复租约日志中的一个租约，占用原来的地址
+        与allocate_address的顺序相同，在包含该地址的地址池中选择范围最小的一个：
+        主机所连端口的地址池，其次是所连交换机的地址池，最后是不限范围的地址池；
+        该地址池不能占用这个地址时不再尝试其他地址池，否则同一个地址可能被范围更小的地址池再次分配
+        :return: Lease，地址不属于主机所连端口、交换机或不限范围的地址池，或已被占用时返回None
+        """
+        if mac in self.by_mac:
+            return None
+        n = ip_to_int(ip)
+        for scope in ((dpid, port), dpid, None):
+            for pool in self.pools.get(scope, ()):
+                if n in pool:
+                    if not pool.reserve(n):
+                        return None
+                    lease = Lease(mac, ip, dpid, port, last_seen, pool)
+                    self.insert(lease)
+                    return lease
+        return None
+
+    def renew(self, mac, now):
+        """
+        更新mac的租约时间
+        :return: Lease，没有租约时返回None
+        """
+        lease = self.by_mac.get(mac)
+        if lease is not None:
+            lease.last_seen = now
+            if self.journal is not None:
+                self.journal.add(lease)
+        return lease
+
+    def release(self, mac):
+        """
+        释放mac的租约，地址放回空闲列表
+        :return: 被释放的Lease，没有租约时返回None
+        """
+        lease = self.by_mac.pop(mac, None)
+        if lease is None:
+            return None
+        del self.mac_by_ip[lease.ip]
+        lease.pool.release(ip_to_int(lease.ip))
+        if self.journal is not None:
+            self.journal.release(lease)
+        return lease
+
+    def next_expiry(self):
+        """
+        :return: 堆中最早的到期时间，没有租约时返回None
+        """
+        return self.expiry_heap[0][0] if self.expiry_heap else None
+
+    def expire(self, now):
+        """
+        释放在now之前到期的租约
+        :return: 被释放的Lease列表
+        """
+        heap = self.expiry_heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            _, _, lease = heapq.heappop(heap)
+            if self.by_mac.get(lease.mac) is not lease:
+                continue            # 租约已经被释放
+            expires = lease.last_seen + self.lease_time
+            if expires > now:
+                heapq.heappush(heap, (expires, next(self.seq), lease))
+                continue            # 已经续租
+            self.release(lease.mac)
+            expired.append(lease)
+        return expired
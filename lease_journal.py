@@ -0,0 +1,137 @@
+import mmap
+import os
+import socket
+import struct
+
+# 一条租约记录：操作, mac, ip, dpid, 端口, 最近一次更新租约的时间(time.time())
+RECORD = struct.Struct('!B6s4sQId')
+OP_LEASE = 1      # 新租约或租约更新
+OP_RELEASE = 2    # 租约释放
+
+COMPACT_RATIO = 4     # 日志记录数超过租约数的这么多倍时压缩
+COMPACT_MIN = 1024    # 日志记录数少于这么多时不压缩
+
+
+def pack_record(op, lease):
+    return RECORD.pack(op, bytes.fromhex(lease.mac.replace(':', '')), socket.inet_aton(lease.ip),
+                       lease.dpid, lease.port, lease.last_seen)
+
+
+def read_records(path):
+    """
+    用mmap读出文件中的所有完整记录，崩溃时写了一半的最后一条记录被忽略
+    :return: (记录列表, 完整记录的总字节数)
+    """
+    if not os.path.exists(path):
+        return [], 0
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        valid = size - size % RECORD.size
+        if valid == 0:
+            return [], 0
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            view = memoryview(mm)
+            records = list(RECORD.iter_unpack(view[:valid]))
+            view.release()
+        finally:
+            mm.close()
+    return records, valid
+
+
+class LeaseJournal(object):
+    """
+    租约日志：租约的每次变化追加到日志文件，定期批量写入并fsync；日志过长时把当前所有租约写成快照并清空日志
+    重启时先读快照再按顺序重放日志，即可恢复崩溃前最后一次fsync时的租约
+        <directory>/leases.snapshot: 压缩后的租约快照，只有OP_LEASE记录
+        <directory>/leases.journal: 快照之后的租约变化
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, 'leases.snapshot')
+        self.journal_path = os.path.join(directory, 'leases.journal')
+        self.file = None
+        self.buffer = []       # 还没有写入文件的记录
+        self.n_records = 0     # 日志文件中的记录数(含buffer)
+
+    def load(self):
+        """
+        读取快照和日志
+        :return: {mac: (ip, dpid, port, last_seen)}
+        """
+        leases = {}
+        snapshot, _ = read_records(self.snapshot_path)
+        journal, valid = read_records(self.journal_path)
+        for op, mac, ip, dpid, port, last_seen in snapshot + journal:
+            mac = mac.hex(':')
+            if op == OP_LEASE:
+                leases[mac] = (socket.inet_ntoa(ip), dpid, port, last_seen)
+            else:
+                leases.pop(mac, None)
+        self.n_records = len(journal)
+        if os.path.exists(self.journal_path):
+            os.truncate(self.journal_path, valid)
+        return leases
+
+    def open(self):
+        """
+        打开日志文件准备追加，应在load之后调用
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.file = open(self.journal_path, 'ab')
+
+    def add(self, lease):
+        self.append(OP_LEASE, lease)
+
+    def release(self, lease):
+        self.append(OP_RELEASE, lease)
+
+    def append(self, op, lease):
+        self.buffer.append(pack_record(op, lease))
+        self.n_records += 1
+
+    def sync(self):
+        """
+        把缓存的记录写入日志文件并fsync
+        """
+        if not self.buffer or self.file is None:
+            return
+        self.file.write(b''.join(self.buffer))
+        self.buffer = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def need_compact(self, n_leases):
+        return self.n_records > max(COMPACT_MIN, COMPACT_RATIO * n_leases)
+
+    def compact(self, leases):
+        """
+        把当前所有租约写成新的快照并清空日志；在替换快照和清空日志之间崩溃时，
+        重放的日志是快照之前的完整历史，重放结果与快照相同
+        :param leases: 当前所有的Lease
+        """
+        self.sync()
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(pack_record(OP_LEASE, lease) for lease in leases))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        if self.file is not None:
+            self.file.truncate(0)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.n_records = 0
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
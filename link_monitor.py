@@ -0,0 +1,87 @@
+LINK_CAPACITY = 1e9      # 链路带宽(bit/s)，交换机的端口统计中没有带宽信息时使用
+UTIL_STEP = 0.2          # 利用率每增加这么多，链路代价升高一级
+HYSTERESIS = 0.05        # 利用率低于当前等级的下限再减去该值时才降级，避免利用率在边界附近波动时路由来回切换
+LEVEL_COST = 1           # 每一级增加的链路代价，空闲链路的代价为1
+EWMA_ALPHA = 0.5         # 利用率的指数滑动平均系数，越大越重视最近一次采样
+
+
+class LinkLoadMonitor(object):
+    """
+    根据交换机端口的字节计数计算链路利用率，并把利用率转换为分级的链路代价
+    等级只在利用率越过阈值时改变，调用者只需在等级改变时重新计算路径
+    """
+
+    def __init__(self, capacity=LINK_CAPACITY, util_step=UTIL_STEP, hysteresis=HYSTERESIS,
+                 level_cost=LEVEL_COST, alpha=EWMA_ALPHA):
+        self.capacity = capacity
+        self.util_step = util_step
+        self.hysteresis = hysteresis
+        self.level_cost = level_cost
+        self.alpha = alpha
+        self.port_counters = {}   # {(dpid, port_no): (tx_bytes, rx_bytes, 统计时长)}
+        self.port_util = {}       # {(dpid, port_no): 平滑后的利用率}
+        self.link_levels = {}     # {(较小的dpid, 较大的dpid): 代价等级}
+
+    def update_port(self, dpid, port_no, tx_bytes, rx_bytes, seconds):
+        """
+        记录一次端口统计，更新端口利用率
+        :param seconds: 端口统计的时长(duration_sec + duration_nsec / 1e9)，用于计算两次统计之间的时间差
+        """
+        key = (dpid, port_no)
+        last = self.port_counters.get(key)
+        self.port_counters[key] = (tx_bytes, rx_bytes, seconds)
+        if last is None or seconds <= last[2] or tx_bytes < last[0] or rx_bytes < last[1]:
+            return                  # 第一次统计，或计数器被重置(端口重启)
+        interval = seconds - last[2]
+        rate = max(tx_bytes - last[0], rx_bytes - last[1]) * 8 / interval
+        util = min(rate / self.capacity, 1.0)
+        old = self.port_util.get(key)
+        self.port_util[key] = util if old is None else self.alpha * util + (1 - self.alpha) * old
+
+    def link_utilization(self, dpid1, dpid2, port_pairs):
+        """
+        :param port_pairs: 两台交换机之间每条链路两端的端口(dpid1的端口, dpid2的端口)
+        :return: 所有链路两端端口利用率的最大值，两台交换机之间有多条并行链路时取最忙的一条
+        """
+        util = 0.0
+        for port_no1, port_no2 in port_pairs:
+            util = max(util, self.port_util.get((dpid1, port_no1), 0.0), self.port_util.get((dpid2, port_no2), 0.0))
+        return util
+
+    def update_link(self, dpid1, dpid2, port_pairs):
+        """
+        按最新的端口利用率更新两台交换机之间链路的代价等级
+        :param port_pairs: 见link_utilization
+        :return: 等级改变时返回新的链路代价，否则返回None
+        """
+        key = (min(dpid1, dpid2), max(dpid1, dpid2))
+        util = self.link_utilization(dpid1, dpid2, port_pairs)
+        level = self.link_levels.get(key, 0)
+        new_level = level
+        while util >= (new_level + 1) * self.util_step:
+            new_level += 1
+        while new_level > 0 and util < new_level * self.util_step - self.hysteresis:
+            new_level -= 1
+        if new_level == level:
+            return None
+        self.link_levels[key] = new_level
+        return self.cost(new_level)
+
+    def cost(self, level):
+        return 1 + level * self.level_cost
+
+    def link_cost(self, dpid1, dpid2):
+        """
+        :return: 链路当前的代价
+        """
+        return self.cost(self.link_levels.get((min(dpid1, dpid2), max(dpid1, dpid2)), 0))
+
+    def forget_link(self, dpid1, dpid2):
+        self.link_levels.pop((min(dpid1, dpid2), max(dpid1, dpid2)), None)
+
+    def forget_switch(self, dpid):
+        for key in [key for key in self.port_counters if key[0] == dpid]:
+            del self.port_counters[key]
+            self.port_util.pop(key, None)
+        for key in [key for key in self.link_levels if dpid in key]:
+            del self.link_levels[key]
@@ -0,0 +1,246 @@
+import multiprocessing
+import os
+from concurrent import futures
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from ryu.lib import hub
+from ryu.topology.short_path import floyd_numpy, INF
+
+FLOYD_MAX_SWITCHES = 64    # 交换机数不超过该值时直接用floyd，稀疏算法的额外开销不划算
+SPARSE_MAX_DENSITY = 0.1   # 链路密度(边数 / n*(n-1))低于该值时认为是稀疏图
+PARALLEL_MIN_SWITCHES = 1000  # 交换机数不少于该值时用多进程并行计算
+PARALLEL_CHUNKS_PER_WORKER = 4  # 每个工作进程分到的任务数，任务太大时各进程的负载不均衡
+
+
+class PathEngine(object):
+    """
+    最短路径计算引擎的基类，所有引擎的compute都与short_path.floyd保持相同的约定：
+        输入: n 交换机个数，dis 邻接距离矩阵(不相连为INF，对角线为0)
+        输出: (path, dis)
+            path[i][j]: 从结点i到结点j的最短路径上j的前一个结点，path[i][i] = i，不可达时path[i][j] = i
+            dis[i][j]: 结点i到结点j的最短距离，不可达时为INF
+    """
+    name = None
+
+    def compute(self, n, dis):
+        raise NotImplementedError()
+
+
+class FloydEngine(PathEngine):
+    """
+    稠密图：向量化的floyd，O(n^3)
+    """
+    name = 'floyd'
+
+    def compute(self, n, dis):
+        path, dis = floyd_numpy(n, dis)
+        return path, dis.astype(np.float64)
+
+
+class BfsEngine(PathEngine):
+    """
+    所有链路权重都为1时可用：从每个交换机出发做一次BFS(scipy的C实现)，复杂度O(n * (n + m))
+    路径长度不逐个结点累加，而是沿着path矩阵对所有结点对同时回溯，循环次数只等于网络直径
+    """
+    name = 'bfs'
+
+    def compute(self, n, dis):
+        adj = to_csr(n, dis)
+        if (adj.data != 1).any():                # 有非单位权重的链路时BFS的结果不是最短路径
+            return DijkstraEngine().compute(n, dis)
+        path = np.repeat(np.arange(n, dtype=np.int32)[:, np.newaxis], n, axis=1)
+        dist = np.full((n, n), INF, dtype=np.float64)
+        if n == 0:
+            return path, dist
+        for src in range(n):
+            order, pred = csgraph.breadth_first_order(adj, src, directed=True,
+                                                      return_predecessors=True)
+            reached = order[1:]
+            path[src, reached] = pred[reached]
+            dist[src, order] = 0
+        # 从每个可达结点沿前一个结点回溯到源结点，回溯的步数即为跳数；用一维下标src * n + node表示结点对
+        flat_path = path.ravel()
+        flat_dist = dist.ravel()
+        pos = np.flatnonzero(flat_dist == 0)
+        pos = pos[pos % n != pos // n]       # 去掉对角线
+        cur = pos.copy()
+        hops = 0
+        while pos.size:
+            hops += 1
+            row_start = cur - cur % n
+            cur = row_start + flat_path[cur]
+            arrived = cur % n == row_start // n
+            flat_dist[pos[arrived]] = hops
+            pos, cur = pos[~arrived], cur[~arrived]
+        return path, dist
+
+
+class DijkstraEngine(PathEngine):
+    """
+    带权稀疏图：在CSR格式的邻接矩阵上对每个源点运行Dijkstra，复杂度O(n * m * log n)
+    存在负权链路时改用Johnson算法
+    """
+    name = 'dijkstra'
+    method = 'D'
+
+    def compute(self, n, dis):
+        adj = to_csr(n, dis)
+        if n == 0:
+            return np.zeros((0, 0), dtype=np.int32), np.zeros((0, 0), dtype=np.float64)
+        method = 'J' if adj.nnz and adj.data.min() < 0 else self.method
+        dist, pred = csgraph.shortest_path(adj, method=method, directed=True,
+                                           return_predecessors=True)
+        return from_csgraph(n, dist, pred)
+
+
+class JohnsonEngine(DijkstraEngine):
+    name = 'johnson'
+    method = 'J'
+
+
+class ParallelDijkstraEngine(PathEngine):
+    """
+    大规模拓扑：按源结点把全源最短路径拆分成多个任务，交给进程池中的多个进程同时运行Dijkstra
+    邻接矩阵(CSR的三个数组)和结果矩阵都放在共享内存中，任务只传递共享内存的名字和源结点范围，不需要序列化矩阵，
+    各进程直接把结果写入结果矩阵中自己负责的行
+    """
+    name = 'parallel'
+    pool = None          # 所有引擎共用一个进程池，避免每次计算都重新创建进程
+    pool_workers = None
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+
+    def get_pool(self):
+        cls = ParallelDijkstraEngine
+        if cls.pool is None or cls.pool_workers != self.workers:
+            if cls.pool is not None:
+                cls.pool.shutdown(wait=False)
+            # 用spawn启动工作进程，不继承控制器进程中eventlet的monkey patch状态
+            cls.pool = futures.ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            cls.pool_workers = self.workers
+        return cls.pool
+
+    def compute(self, n, dis):
+        adj = to_csr(n, dis)
+        if n == 0 or self.workers <= 1 or adj.data.size == 0 or adj.data.min() < 0:
+            return DijkstraEngine().compute(n, dis)
+        blocks = []
+        try:
+            inputs = [share_array(blocks, adj.data), share_array(blocks, adj.indices),
+                      share_array(blocks, adj.indptr)]
+            dist = share_array(blocks, np.empty((n, n), dtype=np.float64))
+            pred = share_array(blocks, np.empty((n, n), dtype=np.int32))
+            step = max(1, -(-n // (self.workers * PARALLEL_CHUNKS_PER_WORKER)))
+            pool = self.get_pool()
+            tasks = [pool.submit(dijkstra_rows, n, inputs, dist, pred, start, min(start + step, n))
+                     for start in range(0, n, step)]
+            while not all(task.done() for task in tasks):
+                hub.sleep(0.005)    # 等待工作进程时让出CPU，不阻塞控制器的其他事件
+            for task in tasks:
+                task.result()
+            return from_csgraph(n, attach_array(blocks, dist).copy(), attach_array(blocks, pred).copy())
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+
+ENGINES = {
+    FloydEngine.name: FloydEngine,
+    BfsEngine.name: BfsEngine,
+    DijkstraEngine.name: DijkstraEngine,
+    JohnsonEngine.name: JohnsonEngine,
+    ParallelDijkstraEngine.name: ParallelDijkstraEngine,
+}
+
+
+def share_array(blocks, array):
+    """
+    把数组复制到一块新建的共享内存中
+    :param blocks: 保存新建的共享内存，用完后由调用者释放
+    :return: 共享内存中数组的描述(名字, 形状, 类型)，可以传给其他进程
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block.name, array.shape, array.dtype.str
+
+
+def attach_array(blocks, spec):
+    """
+    按share_array返回的描述打开共享内存中的数组
+    """
+    name, shape, dtype = spec
+    block = next((block for block in blocks if block.name == name), None)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def dijkstra_rows(n, inputs, dist, pred, start, stop):
+    """
+    在工作进程中运行：以start到stop-1为源结点运行Dijkstra，结果写入共享内存中结果矩阵的对应行
+    """
+    blocks = []
+    try:
+        data, indices, indptr = [attach_array(blocks, spec) for spec in inputs]
+        adj = sparse.csr_matrix((data, indices, indptr), shape=(n, n))
+        rows_dist, rows_pred = csgraph.dijkstra(adj, directed=True, indices=np.arange(start, stop),
+                                                return_predecessors=True)
+        attach_array(blocks, dist)[start:stop] = rows_dist
+        attach_array(blocks, pred)[start:stop] = rows_pred
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def to_csr(n, dis):
+    """
+    把邻接距离矩阵(不相连为INF)转换为CSR格式的稀疏矩阵，只保留真实存在的链路
+    """
+    dis = np.asarray(dis, dtype=np.float64).reshape(n, n)
+    mask = dis < INF
+    np.fill_diagonal(mask, False)
+    rows, cols = np.nonzero(mask)
+    return sparse.csr_matrix((dis[rows, cols], (rows, cols)), shape=(n, n))
+
+
+def from_csgraph(n, dist, pred):
+    """
+    把scipy.sparse.csgraph的结果转换为floyd的约定：不可达用INF表示，没有前一个结点时记为源结点本身
+    """
+    path = pred.astype(np.int32)
+    sources = np.repeat(np.arange(n, dtype=np.int32)[:, np.newaxis], n, axis=1)
+    no_pred = path < 0
+    path[no_pred] = sources[no_pred]
+    dist = np.where(np.isinf(dist), INF, dist)
+    return path, dist
+
+
+def select_engine(n, dis, name='auto'):
+    """
+    选择最短路径计算引擎
+    :param n: 交换机个数
+    :param dis: 邻接距离矩阵
+    :param name: 引擎名称，'auto'表示根据图的规模和稀疏程度自动选择，否则强制使用ENGINES中对应的引擎
+    :return: PathEngine对象
+    """
+    if name != 'auto':
+        return ENGINES[name]()
+    if n <= FLOYD_MAX_SWITCHES:
+        return FloydEngine()
+    dis = np.asarray(dis, dtype=np.float64).reshape(n, n)
+    mask = dis < INF
+    np.fill_diagonal(mask, False)
+    if float(np.count_nonzero(mask)) / (n * (n - 1)) > SPARSE_MAX_DENSITY:
+        return FloydEngine()
+    if n >= PARALLEL_MIN_SWITCHES and (os.cpu_count() or 1) > 1:
+        return ParallelDijkstraEngine()
+    # 实测即使所有链路权重都为1，scipy的Dijkstra也比BfsEngine快，因此稀疏图统一使用Dijkstra
+    return DijkstraEngine()
@@ -0,0 +1,90 @@
+import struct
+from collections import OrderedDict
+
+from ryu.lib import addrconv
+
+DUP_WINDOW = 1.0     # 同一主机对同一地址的重复ARP请求，在该时间(秒)内只回复一次
+PORT_RATE = 100      # 每个交换机端口每秒最多回复的ARP请求个数
+PORT_BURST = 200     # 每个交换机端口允许的突发请求个数
+
+ARP_REPLY_HEADER = struct.pack('!HHBBH', 1, 0x0800, 6, 4, 2)   # 以太网/IPv4，opcode为ARP_REPLY
+
+
+def arp_reply(target_mac, target_ip, dst_mac, dst_ip):
+    """
+    构造ARP响应报文
+    :param target_mac: 被请求地址对应的mac，即响应的源mac
+    :param target_ip: 被请求的地址
+    :param dst_mac: 请求者的mac
+    :param dst_ip: 请求者的ip
+    :return: 以太网帧的字节串
+    """
+    target_mac = addrconv.mac.text_to_bin(target_mac)
+    dst_mac = addrconv.mac.text_to_bin(dst_mac)
+    return b''.join((dst_mac, target_mac, b'\x08\x06', ARP_REPLY_HEADER,
+                     target_mac, addrconv.ipv4.text_to_bin(target_ip),
+                     dst_mac, addrconv.ipv4.text_to_bin(dst_ip)))
+
+
+class ProxyArp(object):
+    """
+    代理ARP：控制器代替目的主机回复ARP请求
+    地址由lookup查询(如租约库的ip到mac索引)，每个请求的处理都是O(1)：
+        目的地址未知时不回复；
+        同一主机在dup_window秒内对同一地址的重复请求只回复一次；
+        每个交换机端口按令牌桶限速，超过速率的请求直接丢弃
+    """
+
+    def __init__(self, lookup, dup_window=DUP_WINDOW, rate=PORT_RATE, burst=PORT_BURST):
+        """
+        :param lookup: 由ip查询mac的函数，未知时返回None
+        """
+        self.lookup = lookup
+        self.dup_window = dup_window
+        self.rate = rate
+        self.burst = burst
+        self.recent = OrderedDict()   # {(请求者mac, 被请求的地址): 回复时间}，按回复时间排序
+        self.buckets = {}             # {(dpid, port_no): [令牌数, 上次更新时间]}
+        self.stats = {'replied': 0, 'unknown': 0, 'duplicate': 0, 'rate_limited': 0}
+
+    def allow(self, dpid, port, now):
+        """
+        从端口的令牌桶中取一个令牌
+        :return: 是否未超过速率
+        """
+        bucket = self.buckets.get((dpid, port))
+        if bucket is None:
+            bucket = self.buckets[(dpid, port)] = [self.burst, now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def resolve(self, dpid, port, src_mac, target_ip, now):
+        """
+        处理一个ARP请求
+        :return: 需要回复时返回target_ip对应的mac，否则返回None
+        """
+        recent = self.recent
+        while recent:
+            key, replied = next(iter(recent.items()))
+            if now - replied < self.dup_window:
+                break
+            del recent[key]
+        key = (src_mac, target_ip)
+        if key in recent:
+            self.stats['duplicate'] += 1
+            return None
+        if not self.allow(dpid, port, now):
+            self.stats['rate_limited'] += 1
+            return None
+        target_mac = self.lookup(target_ip)
+        if target_mac is None:
+            self.stats['unknown'] += 1
+            return None
+        recent[key] = now
+        self.stats['replied'] += 1
+        return target_mac
+
@@ -0,0 +1,78 @@
+import logging
+import time
+
+from ryu.lib import hub
+
+QUIET_WINDOW = 1.0   # 拓扑连续这么长时间(秒)没有变化后才开始计算
+MAX_DELAY = 10.0     # 拓扑持续变化时，距第一次变化最多等待这么长时间(秒)也要计算一次
+
+
+class RecomputeScheduler(object):
+    """
+    拓扑变化后的重算调度器：把一段时间内连续到来的拓扑变化合并成一次计算，并在单独的green thread中执行，
+    不阻塞Ryu的事件分发
+    每次request都会让版本号加一，计算函数可以用is_stale判断计算期间是否又有新的变化，
+    若有则放弃本次结果，由调度器紧接着按最新的拓扑再算一次
+    """
+
+    def __init__(self, func, quiet_window=QUIET_WINDOW, max_delay=MAX_DELAY, logger=None):
+        """
+        :param func: 计算函数，调用方式为func(version, reasons)，reasons为合并的这批变化的原因列表
+        :param quiet_window: 静默时间，单位秒
+        :param max_delay: 最长等待时间，单位秒
+        """
+        self.func = func
+        self.quiet_window = quiet_window
+        self.max_delay = max_delay
+        self.logger = logger or logging.getLogger(__name__)
+        self.version = 0
+        self.reasons = []
+        self.first_request = None   # 这一批变化中第一次变化的时间
+        self.last_request = None    # 这一批变化中最后一次变化的时间
+        self.thread = None
+
+    def request(self, reason):
+        """
+        通知调度器拓扑发生了变化
+        :param reason: 变化的原因，如'link add'
+        """
+        now = time.time()
+        self.version += 1
+        self.reasons.append(reason)
+        if self.first_request is None:
+            self.first_request = now
+        self.last_request = now
+        if self.thread is None:
+            self.thread = hub.spawn(self._run)
+
+    def is_stale(self, version):
+        """
+        :return: version之后拓扑是否又发生了变化
+        """
+        return version != self.version
+
+    def busy(self):
+        """
+        :return: 是否有等待中或正在进行的计算
+        """
+        return self.thread is not None
+
+    def _run(self):
+        try:
+            while self.first_request is not None:
+                wait = min(self.last_request + self.quiet_window,
+                           self.first_request + self.max_delay) - time.time()
+                if wait > 0:
+                    hub.sleep(wait)
+                    continue
+                version = self.version
+                reasons = self.reasons
+                self.reasons = []
+                self.first_request = None
+                self.last_request = None
+                try:
+                    self.func(version, reasons)
+                except Exception:
+                    self.logger.exception('recompute for %s failed', reasons)
+        finally:
+            self.thread = None
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+
+from ryu.topology.short_path import get_switch_sequence
+
+ROUTE_CACHE_SIZE = 4096  # 缓存最近使用的交换机对的路由条数
+
+
+class RouteTable(object):
+    """
+    交换机之间的路由表：只保存最短路径的前驱矩阵，某一对交换机的路由在第一次被用到时才生成，
+    生成结果放入LRU缓存，供经常使用的交换机对重复使用
+    route_table[(src_id, dst_id)]返回[path, ports_list]，与Topo.get_port_seq原来返回的字典中的值相同：
+        path: 从交换机src_id到dst_id经过的交换机id序列
+        ports_list: path中每个交换机的入端口和出端口，如[{"in_port": "unknow", "out_port": 1}, ...]
+    """
+
+    def __init__(self, path, switch_ids, build_ports, cache_size=ROUTE_CACHE_SIZE):
+        """
+        :param path: 最短路径的前驱矩阵，约定与short_path.floyd相同
+        :param switch_ids: switch_ids[i]为前驱矩阵中编号为i的交换机的id
+        :param build_ports: 由交换机id序列求每个交换机入端口和出端口的函数，如Topo.get_ports_with_path
+        :param cache_size: LRU缓存的最大条数
+        """
+        self.path = path
+        self.switch_ids = list(switch_ids)
+        self.switch_index = dict((dpid, i) for i, dpid in enumerate(self.switch_ids))
+        self.build_ports = build_ports
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def __contains__(self, key):
+        src_id, dst_id = key
+        return src_id != dst_id and src_id in self.switch_index and dst_id in self.switch_index
+
+    def __getitem__(self, key):
+        route = self.cache.get(key)
+        if route is not None:
+            self.cache.move_to_end(key)
+            return route
+        if key not in self:
+            raise KeyError(key)
+        src_id, dst_id = key
+        path = self.switch_path(src_id, dst_id)
+        route = [path, self.build_ports(path)]
+        self.cache[key] = route
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return route
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        return self[key]
+
+    def switch_path(self, src_id, dst_id):
+        """
+        :return: 从交换机src_id到dst_id的最短路径上的交换机id序列
+        """
+        index_path = get_switch_sequence(self.switch_index[src_id], self.switch_index[dst_id], self.path)
+        return [self.switch_ids[int(i)] for i in index_path]
+
+
+class HostRoute(object):
+    """
+    两台主机之间的路由：交换机序列和中间交换机的端口直接引用RouteTable中缓存的交换机对路由，不做拷贝，
+    只单独记录连接源主机和目的主机的两个端口
+    """
+    __slots__ = ('path', 'ports', 'src_port', 'dst_port', 'macs')
+
+    def __init__(self, path, ports, src_port, dst_port, macs):
+        """
+        :param path: 交换机id序列，与其他主机对共享，不能修改
+        :param ports: path中每个交换机的入端口和出端口(RouteTable中的ports_list)，与其他主机对共享，不能修改；
+                      源主机和目的主机连接在同一台交换机上时为None
+        :param src_port: 源主机连接的交换机端口
+        :param dst_port: 目的主机连接的交换机端口
+        :param macs: (源主机mac, 目的主机mac)
+        """
+        self.path = path
+        self.ports = ports
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.macs = macs
+
+    def hops(self):
+        """
+        依次生成路径上每台交换机的(dpid, 入端口, 出端口)
+        """
+        last = len(self.path) - 1
+        for i, dpid in enumerate(self.path):
+            in_port = self.src_port if i == 0 else self.ports[i]['in_port']
+            out_port = self.dst_port if i == last else self.ports[i]['out_port']
+            yield dpid, in_port, out_port
+
+    def __iter__(self):
+        """
+        兼容原来[path, ports, macs]的格式：path, ports, macs = route
+        """
+        yield self.path
+        yield [{"in_port": in_port, "out_port": out_port} for _, in_port, out_port in self.hops()]
+        yield list(self.macs)
@@ -1,4 +1,7 @@
+import numpy as np
+
 INF = 10000
+FLOYD_BLOCK_SIZE = 256  # 向量化floyd每次处理的行块大小，控制临时矩阵的规模
 
 
 def floyd(n, dis):
@@ -30,6 +33,46 @@ def floyd(n, dis):
     return path, dis
 
 
+def floyd_numpy(n, dis, block_size=FLOYD_BLOCK_SIZE):
+    """
+    floyd的NumPy向量化实现，返回值与floyd相同：(path, dis)，且得到的path矩阵与floyd完全一致
+    对每个中间结点k，一次性用第k行和第k列更新整个矩阵；在第k轮中第k行、第k列本身不会被改变，
+    因此按k逐轮整体更新与floyd的三重循环等价。当n较大时按行分块更新，避免生成n*n的临时矩阵
+    :param n: 交换机个数
+    :param dis: dis[i][j]表示第i个节点到第j个节点的距离，可以是列表或NumPy矩阵
+    :param block_size: 每次更新的行数
+    :return:
+        path: int32矩阵，含义同floyd
+        dis: 最短距离矩阵，整数输入为int32，否则为float64
+    """
+    dis = np.asarray(dis)
+    dtype = np.int32 if dis.dtype.kind in 'iu' else np.float64
+    dis = np.array(dis, dtype=dtype).reshape(n, n)
+    path = np.repeat(np.arange(n, dtype=np.int32)[:, np.newaxis], n, axis=1)
+    if n == 0:
+        return path, dis
+    block_size = max(1, min(block_size, n))
+    for k in range(n):
+        dis_k = dis[k].copy()               # 第k行：k到各结点的距离
+        path_k = path[k].copy()
+        valid_kj = dis_k != INF
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            dis_ik = dis[start:stop, k]
+            valid_ik = dis_ik != INF
+            if not valid_ik.any():
+                continue
+            block = dis[start:stop]
+            through_k = dis_ik[:, np.newaxis] + dis_k[np.newaxis, :]
+            better = (block > through_k) & valid_ik[:, np.newaxis] & valid_kj[np.newaxis, :]
+            if not better.any():
+                continue
+            rows, cols = np.nonzero(better)
+            block[rows, cols] = through_k[rows, cols]
+            path[start:stop][rows, cols] = path_k[cols]
+    return path, dis
+
+
 def get_switch_sequence(src, dst, whole_path):
     """
     :param src: 源结点
@@ -59,9 +102,21 @@ def get_all_short_path_sequence(n_switches, dis):
     :return:
         path_sequence：交换机i到j的最短路径上的交换机序号组成的序列
     """
-    path_sequence = []
     # n_switches = len(switches)
-    path, dis = floyd(n_switches, dis)
+    path, dis = floyd_numpy(n_switches, dis)
+    return get_path_sequence(n_switches, path)
+
+
+def get_path_sequence(n_switches, path):
+    """
+    :param n_switches: 交换机个数
+    :param path: floyd返回的路径矩阵
+    :return:
+        path_sequence：交换机i到j的最短路径上的交换机序号组成的序列
+    """
+    path_sequence = []
+    if isinstance(path, np.ndarray):
+        path = path.tolist()  # 逐个元素回溯路径时，列表的索引比NumPy矩阵快得多
     for i in range(n_switches):
         # for j in range(i + 1, len(switches)):
         for j in range(n_switches):
@@ -70,6 +125,25 @@ def get_all_short_path_sequence(n_switches, dis):
     return path_sequence
 
 
+def get_equal_cost_next_hops(weight, dis, dst):
+    """
+    求所有结点到结点dst的所有等价最短路径的下一跳
+    k是i到dst的一个下一跳，当且仅当i与k相连且 weight[i][k] + dis[k][dst] == dis[i][dst]
+    :param weight: 链路权重矩阵，不相连为INF
+    :param dis: 最短距离矩阵(floyd返回的dis)
+    :param dst: 目的结点
+    :return: n*n的布尔矩阵next_hops，next_hops[i][k]为True表示k是从i到dst的一个等价下一跳
+    """
+    weight = np.asarray(weight, dtype=np.float64)
+    to_dst = np.asarray(dis, dtype=np.float64)[:, dst]
+    through = weight + to_dst[np.newaxis, :]     # through[i][k]: 经过k到达dst的距离
+    next_hops = (weight < INF) & (np.abs(through - to_dst[:, np.newaxis]) < 1e-9)
+    next_hops &= (to_dst < INF)[:, np.newaxis] & (to_dst < INF)[np.newaxis, :]
+    np.fill_diagonal(next_hops, False)
+    next_hops[dst, :] = False
+    return next_hops
+
+
 if __name__ == '__main__':
     switches = [1, 2, 3, 4]
     # switches = [0, 1, 2, 3, 4, 5]
@@ -1,8 +1,10 @@
+from ryu import cfg
 from ryu.base import app_manager
 from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
+from ryu.lib import hub
 from ryu.lib.packet import packet
 from ryu.lib.packet import ethernet
 from ryu.lib.packet import ether_types
@@ -10,11 +12,33 @@ from ryu.topology import switches
 from ryu.topology import event
 from ryu.topology import dhcps
 from scipy import sparse
+import numpy as np
+import itertools
 import time
-import copy
 from ryu.lib.packet import ether_types, arp
 
-from ryu.topology.short_path import get_all_short_path_sequence, INF
+from ryu.topology.short_path import get_path_sequence, get_equal_cost_next_hops, INF
+from ryu.topology.dynamic_path import DynamicShortPath
+from ryu.topology.path_engine import select_engine, ENGINES
+from ryu.topology.route_table import RouteTable, HostRoute, ROUTE_CACHE_SIZE
+from ryu.topology.recompute import RecomputeScheduler, QUIET_WINDOW
+from ryu.topology.flow_table import flow_key, diff_flows, to_match, to_actions
+from ryu.topology.flow_table import flow_from_stats, group_from_stats, ROUTE_COOKIE
+from ryu.topology.flow_installer import FlowInstaller
+from ryu.topology.link_monitor import LinkLoadMonitor
+from ryu.topology.lease import parse_range, ip_to_int, int_to_ip
+
+CONF = cfg.CONF
+CONF.register_opts([
+    cfg.StrOpt('path-engine', default='auto', choices=['auto'] + sorted(ENGINES),
+               help='shortest path engine; auto picks floyd, dijkstra or parallel by network '
+                    'size and density, bfs and johnson are only used when named explicitly'),
+    cfg.StrOpt('forwarding-mode', default='pair', choices=['pair', 'tree', 'ecmp', 'prefix'],
+               help='routing flows: pair per host pair, tree per destination host, ecmp like tree '
+                    'with SELECT groups, prefix per destination switch (needs dhcp_addressing=switch)'),
+    cfg.IntOpt('port-stats-interval', default=10,
+               help='seconds between port stats requests used for link costs, 0 disables polling')
+])
 
 
 class Topo(app_manager.RyuApp):
@@ -32,12 +56,65 @@ class Topo(app_manager.RyuApp):
         self.switches = []  # 记录所有的{switch},方便计算邻接矩阵
         self.links = {}  # 记录交换机之间的连接 {port1:port2,...} 最好这么记录
         self.host = {}  # 记录所有主机的信息 {mac:(dpid, port_no,ip)}
+        self.adjacency = {}  # 交换机之间的邻接关系 {dpid1: {dpid2: {(dpid1的端口, dpid2的端口): None}}}，由链路事件增量维护
+        self.adj_cache = {}  # 由self.adjacency导出的邻接矩阵、端口映射等视图，拓扑变化时清空
+        self.topo_version = 0  # 拓扑版本号，交换机、链路或链路代价每变化一次加一，与清空self.adj_cache同时进行
+        self.installed_flows = {}  # 已经下发到每台交换机的路由流表项 {dpid: {键: 动作}}，见flow_table.flow_key
+        # 转发模式：'pair'为每对主机在路径上的每台交换机下发流表项；'tree'为每个目的主机建立一棵最短路径树，
+        # 每台交换机上每个目的主机只有一条流表项；'ecmp'与'tree'相同，但有多个等价下一跳时用SELECT组表分担流量；
+        # 'prefix'与'tree'相同，但按DHCP分配给目的交换机的地址前缀聚合，每台交换机上每个目的交换机只有一条流表项
+        # 由配置项forwarding_mode指定
+        self.forwarding_mode = CONF.forwarding_mode
+        self.dhcp = kwargs.get('dhcp')  # DHCPResponder实例，'prefix'模式下查询每台交换机的地址前缀
+        # 主机地址不是从所连交换机的前缀中分配时，按前缀聚合的路由是错的
+        if self.forwarding_mode == 'prefix' and (self.dhcp is None or self.dhcp.addressing != 'switch'):
+            raise ValueError("forwarding_mode 'prefix' requires dhcp_addressing 'switch'")
+        self.installed_groups = {}  # 已经下发到每台交换机的组表 {dpid: {group_id: (出端口, ...)}}
+        self.group_ids = {}  # ECMP组表编号 {目的交换机dpid: group_id}，所有交换机上指向同一目的交换机的组表编号相同
+        self.flow_installer = FlowInstaller(logger=self.logger)  # 批量下发FlowMod并用barrier跟踪交换机的处理进度
+        self.last_route_update = None  # 最近一次路由更新，见flow_installer.RouteUpdate
+        self.link_monitor = LinkLoadMonitor()  # 由端口统计计算链路利用率和链路代价
+        self.port_stats_interval = CONF.port_stats_interval  # 向交换机请求端口统计的周期(秒)，0表示不请求
+        self.monitor_thread = None  # 请求端口统计的green thread，由start启动
+        self.dynamic_path = None  # 动态维护的最短路径，链路变化时增量更新，交换机变化时置为None以便整体重算
+        # 最短路径计算引擎，由配置项path_engine指定：'auto'按交换机个数和稀疏程度自动选择'floyd','dijkstra'或'parallel'；
+        # 也可以指定path_engine.ENGINES中的任一引擎，'bfs'和'johnson'只在指定时使用
+        self.path_engine = CONF.path_engine
+        self.route_cache_size = ROUTE_CACHE_SIZE  # 路由表中缓存的交换机对路由的条数
+        self.host_flow_chunk = 256  # 主机加入或离开时，每计算这么多条主机对路由或下发这么多条FlowMod让出一次CPU
+        # 合并连续的拓扑变化，静默QUIET_WINDOW秒后在green thread中重新计算路径
+        self.recompute_scheduler = RecomputeScheduler(self.recompute_routes, QUIET_WINDOW, logger=self.logger)
+        # 正在查询已有流表项的交换机 {dpid: [{键: 动作}, {group_id: (出端口, ...)}, 未完成的查询个数]}，
+        # 查询完成前sync_flows不向其下发流表项
+        self.reconciling = {}
+        self.reconcile_timeout = 5  # 交换机在这么多秒内没有回复完查询时，按已经收到的流表项处理
+        # 控制器启动后主机表是空的，要等租约日志恢复或主机续租后才完整；在此之前查询到的流表项不删除，
+        # 最多保留这么多秒(约两个租期，保证每台主机都至少续租一次)
+        self.reconcile_hold_time = 60
+        self.reconcile_hold_until = 0  # 保留期的结束时间，由start设置，0表示不在保留期内
+        self.held_flows = {}  # 保留期内查询到的流表项 {dpid: set(键)}，sync_flows不删除它们
+        self.held_groups = {}  # 保留期内查询到的组表 {dpid: set(group_id)}
+
+    def start(self):
+        thread = super(Topo, self).start()
+        if self.port_stats_interval > 0:
+            self.monitor_thread = hub.spawn(self.port_stats_loop)
+        if self.reconcile_hold_time > 0:
+            self.reconcile_hold_until = time.time() + self.reconcile_hold_time
+            hub.spawn_after(self.reconcile_hold_time, self.end_reconcile_hold)
+        return thread
 
     @set_ev_cls(event.EventSwitchEnter)
     def switch_enter_handler(self, ev):
         sw = ev.switch
         self.switches.append(sw)
         self.switchMap[sw.dp.id] = len(self.switches) - 1
+        self.dynamic_path = None
+        self.adj_cache.clear()
+        self.topo_version += 1
+        self.installed_flows.pop(sw.dp.id, None)
+        self.installed_groups.pop(sw.dp.id, None)
+        self.start_reconcile(sw.dp)        # 重连的交换机或控制器重启时，交换机上可能保留着之前下发的流表项
         print("switch " + str(sw.dp.id) + " enter")
 
     @set_ev_cls(event.EventSwitchLeave)
@@ -45,14 +122,110 @@ class Topo(app_manager.RyuApp):
         sw = ev.switch
         if sw in self.switches:
             self.switches.remove(sw)
-            del self.switchMap[sw.dp.id]
+            # 删除交换机后其后面的交换机在列表中的序号都变了，需要重新编号
+            self.switchMap = dict((s.dp.id, i) for i, s in enumerate(self.switches))
+            for nbrs in self.adjacency.values():
+                nbrs.pop(sw.dp.id, None)
+            self.adjacency.pop(sw.dp.id, None)
+            self.dynamic_path = None
+            self.adj_cache.clear()
+            self.topo_version += 1
+            self.installed_flows.pop(sw.dp.id, None)
+            self.installed_groups.pop(sw.dp.id, None)
+            self.reconciling.pop(sw.dp.id, None)
+            self.held_flows.pop(sw.dp.id, None)
+            self.held_groups.pop(sw.dp.id, None)
+            self.link_monitor.forget_switch(sw.dp.id)
+            for update in self.flow_installer.datapath_gone(sw.dp.id):
+                self.report_route_update(update)
             print("switch " + str(sw.dp.id) + " leave")
 
+    def start_reconcile(self, datapath):
+        """
+        查询交换机上已有的路由流表项和组表，查询完成后作为installed_flows和installed_groups，
+        之后的sync_flows只下发缺少的、动作不同的流表项并删除多余的流表项
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        state = [{}, {}, 2]
+        self.reconciling[datapath.id] = state
+        datapath.send_msg(parser.OFPFlowStatsRequest(datapath, 0, ofproto.OFPTT_ALL, ofproto.OFPP_ANY,
+                                                     ofproto.OFPG_ANY, ROUTE_COOKIE, 0xffffffffffffffff,
+                                                     parser.OFPMatch()))
+        datapath.send_msg(parser.OFPGroupDescStatsRequest(datapath, 0))
+        hub.spawn_after(self.reconcile_timeout, self.finish_reconcile, datapath.id, state)
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        """
+        流表项较多时交换机分多条消息回复，每条消息到达时就转换并合并，不保存原始消息
+        """
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        state = self.reconciling.get(msg.datapath.id)
+        if state is None:
+            return
+        for stat in msg.body:
+            if stat.cookie != ROUTE_COOKIE:
+                continue
+            key, actions = flow_from_stats(ofproto, stat)
+            state[0][key] = actions
+        if not msg.flags & ofproto.OFPMPF_REPLY_MORE:
+            self.reconcile_part_done(msg.datapath.id, state)
+
+    @set_ev_cls(ofp_event.EventOFPGroupDescStatsReply, MAIN_DISPATCHER)
+    def group_desc_stats_reply_handler(self, ev):
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        state = self.reconciling.get(msg.datapath.id)
+        if state is None:
+            return
+        for desc in msg.body:
+            group_id, ports = group_from_stats(ofproto, desc)
+            state[1][group_id] = ports
+        if not msg.flags & ofproto.OFPMPF_REPLY_MORE:
+            self.reconcile_part_done(msg.datapath.id, state)
+
+    def reconcile_part_done(self, dpid, state):
+        state[2] -= 1
+        if state[2] == 0:
+            self.finish_reconcile(dpid, state)
+
+    def finish_reconcile(self, dpid, state):
+        """
+        查询完成或超时：记录交换机上已有的流表项，重新计算并同步路由
+        """
+        if self.reconciling.get(dpid) is not state:
+            return                  # 已经完成，或交换机断开后又重新连接
+        del self.reconciling[dpid]
+        self.installed_flows[dpid] = state[0]
+        self.installed_groups[dpid] = state[1]
+        if time.time() < self.reconcile_hold_until:
+            self.held_flows[dpid] = set(state[0])
+            self.held_groups[dpid] = set(state[1])
+        print("switch {0} has {1} flow entries, {2} groups".format(dpid, len(state[0]), len(state[1])))
+        self.send_event_to_observers(event.EventTopoChange('reconcile'))
+
+    def end_reconcile_hold(self):
+        """
+        主机已经恢复或保留期已过：不再保留查询到的流表项，重新同步以删除其中多余的部分
+        """
+        if not self.reconcile_hold_until:
+            return
+        self.reconcile_hold_until = 0
+        held = bool(self.held_flows or self.held_groups)
+        self.held_flows.clear()
+        self.held_groups.clear()
+        if held:
+            self.send_event_to_observers(event.EventTopoChange('reconcile hold end'))
+
     @set_ev_cls(event.EventLinkAdd)
     def link_add_handler(self, ev):
         l = ev.link
         if l.src.dpid not in self.links:
             self.links[l.src] = l.dst
+        self.add_adjacency(l.src, l.dst)
+        self.update_dynamic_path(l, True)
         self.send_event_to_observers(event.EventTopoChange('link add'))
         print("link s%d %d and s%d %d up" % (l.src.dpid, l.src.port_no, l.dst.dpid, l.dst.port_no))
 
@@ -61,48 +234,216 @@ class Topo(app_manager.RyuApp):
         l = ev.link
         if l.src in self.links:
             del self.links[l.src]
+        reverse = self.links.get(l.dst)
+        if reverse is None or reverse != l.src:     # 反方向的链路也删除后，两个端口之间才真正断开
+            self.remove_adjacency(l.src, l.dst)
+        self.update_dynamic_path(l, False)
         self.send_event_to_observers(event.EventTopoChange('link delete'))
         print("link s%d %d and s%d %d down" % (l.src.dpid, l.src.port_no, l.dst.dpid, l.dst.port_no))
 
+    def update_dynamic_path(self, link, added):
+        """
+        链路增加或删除时，增量更新已经计算好的最短路径矩阵
+        若涉及的交换机还没有编号，则放弃增量更新，等到下一次计算路径时整体重算
+        :param link: 发生变化的链路
+        :param added: True表示链路增加，False表示链路删除
+        """
+        if self.dynamic_path is None:
+            return
+        i = self.switchMap.get(link.src.dpid)
+        j = self.switchMap.get(link.dst.dpid)
+        if i is None or j is None or self.dynamic_path.n != len(self.switches):
+            self.dynamic_path = None
+            return
+        if added:
+            self.dynamic_path.add_edge(i, j, self.link_monitor.link_cost(link.src.dpid, link.dst.dpid))
+        elif not self.is_linked(link.src.dpid, link.dst.dpid):   # 邻接矩阵是对称的，反方向的链路也删除后才算断开
+            self.dynamic_path.remove_edge(i, j)
+
+    def is_linked(self, dpid1, dpid2):
+        """
+        判断两个交换机之间是否还有任意方向的链路
+        """
+        return bool(self.adjacency.get(dpid1, {}).get(dpid2))
+
+    def add_adjacency(self, src, dst):
+        """
+        在邻接关系中记录端口src和dst之间的链路，两个方向同时记录
+        :param src: 链路的源端口
+        :param dst: 链路的目的端口
+        """
+        self.adjacency.setdefault(src.dpid, {}).setdefault(dst.dpid, {})[(src.port_no, dst.port_no)] = None
+        self.adjacency.setdefault(dst.dpid, {}).setdefault(src.dpid, {})[(dst.port_no, src.port_no)] = None
+        self.adj_cache.clear()
+        self.topo_version += 1
+
+    def remove_adjacency(self, src, dst):
+        """
+        从邻接关系中删除端口src和dst之间的链路，两个交换机之间没有其他链路时删除这条边
+        """
+        for a, b in ((src, dst), (dst, src)):
+            ports = self.adjacency.get(a.dpid, {}).get(b.dpid)
+            if ports is None:
+                continue
+            ports.pop((a.port_no, b.port_no), None)
+            if not ports:
+                del self.adjacency[a.dpid][b.dpid]
+                self.link_monitor.forget_link(a.dpid, b.dpid)
+        self.adj_cache.clear()
+        self.topo_version += 1
+
+    def port_stats_loop(self):
+        """
+        周期性地向所有交换机请求端口统计，用于计算链路利用率
+        """
+        while True:
+            for sw in list(self.switches):
+                datapath = sw.dp
+                ofproto = datapath.ofproto
+                parser = datapath.ofproto_parser
+                datapath.send_msg(parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY))
+            hub.sleep(self.port_stats_interval)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def port_stats_reply_handler(self, ev):
+        """
+        更新交换机各端口的利用率；与该交换机相连的链路代价等级改变时更新最短路径并触发重新下发流表
+        """
+        dpid = ev.msg.datapath.id
+        for stat in ev.msg.body:
+            self.link_monitor.update_port(dpid, stat.port_no, stat.tx_bytes, stat.rx_bytes,
+                                          stat.duration_sec + stat.duration_nsec / 1e9)
+        changed = []
+        for nbr_dpid, ports in self.adjacency.get(dpid, {}).items():
+            cost = self.link_monitor.update_link(dpid, nbr_dpid, ports)
+            if cost is not None:
+                changed.append((nbr_dpid, cost))
+        if not changed:
+            return
+        self.adj_cache.clear()
+        self.topo_version += 1
+        for nbr_dpid, cost in changed:
+            print("link s%d and s%d cost changes to %s" % (dpid, nbr_dpid, cost))
+            i = self.switchMap.get(dpid)
+            j = self.switchMap.get(nbr_dpid)
+            if self.dynamic_path is not None and i is not None and j is not None:
+                self.dynamic_path.update_edge(i, j, cost)
+        self.send_event_to_observers(event.EventTopoChange('link cost'))
+
     @set_ev_cls(event.EventHostAdd)
     def Host_Add_Handler(self, ev):
         h = ev.host
         if h.mac not in self.host:
             self.host[h.mac] = (h.port.split(':')[0], h.port.split(':')[1], h.ipv4)
-            self.send_event_to_observers(event.EventTopoChange('host add'))
+            host_flows = self.build_host_flow_set(h.mac)
+            if host_flows is None:
+                self.send_event_to_observers(event.EventTopoChange('host add'))
+            else:
+                self.sync_host_flows(host_flows)
             print("host %s %s add" % (h.mac, h.ipv4))
 
+    @set_ev_cls(dhcps.EventHostBulkAdd)
+    def Host_Bulk_Add_Handler(self, ev):
+        """
+        与Host_Add_Handler相同，逐个主机只下发与它有关的流表项；
+        某台主机需要整体重算时，其余主机也交给这次整体重算
+        """
+        self.end_reconcile_hold()        # 从租约日志恢复了主机，主机表已经完整
+        added = 0
+        recompute = False
+        for h in ev.hosts:
+            if h.mac in self.host:
+                continue
+            self.host[h.mac] = (h.port.split(':')[0], h.port.split(':')[1], h.ipv4)
+            added += 1
+            host_flows = None if recompute else self.build_host_flow_set(h.mac)
+            if host_flows is None:
+                recompute = True
+            else:
+                self.sync_host_flows(host_flows)
+        if recompute:
+            self.send_event_to_observers(event.EventTopoChange('hosts add'))
+        if added:
+            print("%d hosts add" % added)
+
+    @set_ev_cls(dhcps.EventHostBulkDelete)
+    def Host_Bulk_Delete_Handler(self, ev):
+        """
+        与Host_Delete_Handler相同，逐个主机只删除与它有关的流表项；
+        某台主机需要整体重算时，其余主机也交给这次整体重算
+        """
+        removed = 0
+        recompute = False
+        for h in ev.hosts:
+            if h.mac not in self.host:
+                continue
+            host_flows = None if recompute else self.build_host_flow_set(h.mac)
+            del self.host[h.mac]
+            removed += 1
+            if host_flows is None:
+                recompute = True
+            else:
+                self.sync_host_flows(host_flows, removed=True)
+        if recompute:
+            self.send_event_to_observers(event.EventTopoChange('hosts delete'))
+        if removed:
+            print("%d hosts delete" % removed)
+
     @set_ev_cls(event.EventHostDelete)
     def Host_Delete_Handler(self, ev):
         h = ev.host
         if h.mac in self.host:
-            self.host[h.mac] = (h.port.split(':')[0], h.port.split(':')[1], h.ipv4)
+            host_flows = self.build_host_flow_set(h.mac)    # 删除主机之前按已记录的位置计算与它有关的流表项
             del self.host[h.mac]
-            self.send_event_to_observers(event.EventTopoChange('host delete'))
+            if host_flows is None:
+                self.send_event_to_observers(event.EventTopoChange('host delete'))
+            else:
+                self.sync_host_flows(host_flows, removed=True)
             print("host %s %s delete" % (h.mac, h.ipv4))
 
     def getAdjMatrix(self):
+        """
+        由self.adjacency导出的稠密邻接矩阵，结果缓存到下一次拓扑变化，调用者不要修改返回的矩阵
+        """
         if len(self.switches) == 0:
             return []
-        r = sparse.dok_matrix((len(self.switches), len(self.switches)))
-        for i in range(len(self.switches)):
-            for j in range(len(self.switches)):
-                if i != j:
-                    for port1 in self.switches[i].ports:
-                        for port2 in self.switches[j].ports:
-                            if self.links.get(port1) and self.links[port1] == port2:
-                                r[i, j] = 1
-                                r[j, i] = 1
-        return r.toarray()
+        if 'dense' not in self.adj_cache:
+            self.adj_cache['dense'] = self.get_adj_csr().toarray()
+        return self.adj_cache['dense']
+
+    def get_adj_csr(self):
+        """
+        由self.adjacency导出的CSR格式的邻接矩阵，编号为交换机在switches列表中的序号，结果缓存到下一次拓扑变化
+        矩阵中的值为链路代价，空闲链路为1，随链路利用率升高，见link_monitor
+        """
+        if 'csr' not in self.adj_cache:
+            rows = []
+            cols = []
+            costs = []
+            for dpid1, nbrs in self.adjacency.items():
+                i = self.switchMap.get(dpid1)
+                if i is None:
+                    continue
+                for dpid2, ports in nbrs.items():
+                    j = self.switchMap.get(dpid2)
+                    if j is None or i == j or not ports:
+                        continue
+                    rows.append(i)
+                    cols.append(j)
+                    costs.append(self.link_monitor.link_cost(dpid1, dpid2))
+            n = len(self.switches)
+            self.adj_cache['csr'] = sparse.csr_matrix((np.array(costs, dtype=np.float64), (rows, cols)),
+                                                      shape=(n, n))
+        return self.adj_cache['csr']
 
     # 判断；两个交换机是否相连，相连返回连接端口，不想连返回空
     def isConnect(self, sw1, sw2):
         assert isinstance(sw1, switches.Switch)
         assert isinstance(sw2, switches.Switch)
-        for port1 in sw1.ports:
-            for port2 in sw2.ports:
-                if self.links.get(port1) and self.links[port1] == port2:
-                    return (port1.dpid, port1.port_no, port2.dpid, port2.port_no)
+        ports = self.adjacency.get(sw1.dp.id, {}).get(sw2.dp.id)
+        if ports:
+            port_no1, port_no2 = next(iter(ports))
+            return (sw1.dp.id, port_no1, sw2.dp.id, port_no2)
         return None
 
     # 捕获拓扑改变的函数
@@ -111,78 +452,231 @@ class Topo(app_manager.RyuApp):
         """
         当拓扑发生变化时，首先重新计算新的最短路径，删除之前的流表(table-miss和packet_in消息处理流表项除外)
         重新下发流表
+        计算不在事件处理函数中进行，而是交给self.recompute_scheduler，连续的多次变化只计算一次
         :param ev:
         :return:
         """
-        print('topoChangeHandler: topo changed !')
-        print('==============getAdjMatrix=================')
-        print(self.getAdjMatrix())
-        print('===============switchMap==================')
-        print(self.switchMap)
-        print('=================host=====================')
-        print(self.host)
-        print('==================links====================')
-        # for item in self.links:
-        #     print('in_port: {0}, out_port: {1}'.format(item, self.links[item]))
-        #     # print(item.__dict__)
-        # print('===================links end======================')
-        # a = self.isConnect(self.switches[0], self.switches[2])
-        # if a is not None:
-        #     print(a[0],a[1],a[2],a[3])
-        # print(ev.msg)
-
-        time.sleep(30)
-        ip_port_dict = self.compute_path_between_all_hosts()
-        print('I am going to delete old flow tables.I am going to delete old flow tables')
-        self.drop_all_flow_entities()
-        print('I am wating here')
-        time.sleep(120)             # 为了观察流表真的被删除了，后面可以删除代码
-        self.add_flow_table_item(ip_port_dict)
-
-
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None):
-        """
-        :param actions: 对满足过滤条件的流做的动作列表
-        :param command: 表示对流表的操作，包括增加(Add)、删除(Delete)、修改(Modify)
+        print('topoChangeHandler: topo changed ! ({0})'.format(ev.msg))
+        self.recompute_scheduler.request(ev.msg)
+
+    def recompute_routes(self, version, reasons):
+        """
+        由self.recompute_scheduler调用：重新计算所有主机之间的路径并重新下发流表
+        :param version: 本次计算对应的拓扑版本
+        :param reasons: 合并在本次计算中的拓扑变化原因
+        """
+        print('recompute routes for {0} topo changes: {1}'.format(len(reasons), reasons))
+        start = time.time()
+        desired_flows, desired_groups = self.compute_flow_set()
+        hub.sleep(0)                # 让出CPU处理计算期间到来的事件
+        if self.recompute_scheduler.is_stale(version):
+            print('topo changed during recompute, drop stale routes')
+            return
+        self.last_route_update = self.sync_flows(desired_flows, desired_groups)
+        sizes = [len(flows) for flows in desired_flows.values()] or [0]
+        print('{0} mode: {1} flow entries, at most {2} per switch, {3:.3f}s'.format(
+            self.forwarding_mode, sum(sizes), max(sizes), time.time() - start))
+
+    def compute_flow_set(self):
+        """
+        按self.forwarding_mode计算每台交换机上应该有的路由流表项和组表
+        :return: (desired_flows, desired_groups)
+            desired_flows: {dpid: {键: 动作}}
+            desired_groups: {dpid: {group_id: (出端口, ...)}}，只有ecmp模式才有组表
+        """
+        if self.forwarding_mode == 'ecmp':
+            return self.build_ecmp_flow_set()
+        if self.forwarding_mode == 'tree':
+            return self.build_tree_flow_set(), {}
+        if self.forwarding_mode == 'prefix':
+            return self.build_prefix_flow_set(), {}
+        return self.build_flow_set(self.iter_host_routes()), {}
+
+    def build_host_flow_set(self, host_mac):
+        """
+        主机加入或离开时交换机之间的路径没有变化，只需计算与这台主机有关的流表项：
+            pair模式：该主机与其他每台主机之间两个方向的路由，共2·(H-1)条，交换机对路由取自缓存的RouteTable，
+            每计算self.host_flow_chunk条路由让出一次CPU，期间若开始了整体重算，则交给整体重算处理；
+            tree、prefix模式：以该主机为目的的流表项，该主机所连的交换机上必须还有其他主机，
+            否则其他主机的最短路径树也要改变
+        ecmp模式，或者还有等待中、正在进行的整体重算时，返回None，由调用者交给self.recompute_scheduler整体重算
+        :return: {dpid: {键: 动作}}
+        """
+        if self.recompute_scheduler.busy() or not self.switches or self.dynamic_path is None:
+            return None
+        dst_dpid = int(self.host[host_mac][0])
+        if dst_dpid not in self.switchMap:
+            return None
+        if self.forwarding_mode == 'pair':
+            desired_flows = {}
+            host_routes = self.iter_host_routes(host_mac)
+            while True:
+                chunk = list(itertools.islice(host_routes, self.host_flow_chunk))
+                if not chunk:
+                    return desired_flows
+                self.build_flow_set(chunk, desired_flows)
+                hub.sleep(0)        # 让出CPU，主机数很多时不长时间阻塞其他事件
+                if self.recompute_scheduler.busy():
+                    return None
+        if self.forwarding_mode not in ('tree', 'prefix'):
+            return None
+        hosts_by_switch = self.get_hosts_by_switch()
+        if len(hosts_by_switch[dst_dpid]) < 2:
+            return None
+        host_port, host_ip = int(self.host[host_mac][1]), self.host[host_mac][2]
+        tree = self.get_tree_to_switch(dst_dpid, list(hosts_by_switch))
+        desired_flows = {}
+        if self.forwarding_mode == 'tree':
+            self.add_host_tree_flows(desired_flows, 2, dst_dpid, tree, (host_mac, host_port, host_ip))
+        else:
+            self.add_host_tree_flows(desired_flows, 3, dst_dpid, tree, (host_mac, host_port, host_ip),
+                                     self.get_switch_prefix(dst_dpid))
+        return desired_flows
+
+    def sync_host_flows(self, host_flows, removed=False):
+        """
+        下发或删除build_host_flow_set计算出的流表项，并更新self.installed_flows；其他流表项不受影响
+        每self.host_flow_chunk条FlowMod发送一次并让出CPU，所有批次计入同一个RouteUpdate
+        :param removed: True表示主机离开，删除这些流表项
+        """
+        n_msgs = 0
+        update = None
+        for dpid, flows in host_flows.items():
+            if dpid not in self.switchMap or dpid in self.reconciling:
+                continue
+            datapath = self.switches[self.switchMap[dpid]].dp
+            ofproto = datapath.ofproto
+            installed = self.installed_flows.setdefault(dpid, {})
+            for key, actions in flows.items():
+                old = installed.get(key)
+                if removed:
+                    if old is None:
+                        continue
+                    self.send_flow_mod(datapath, ofproto.OFPFC_DELETE_STRICT, key)
+                    del installed[key]
+                elif old is None:
+                    self.send_flow_mod(datapath, ofproto.OFPFC_ADD, key, actions)
+                    installed[key] = actions
+                elif old != actions:
+                    self.send_flow_mod(datapath, ofproto.OFPFC_MODIFY_STRICT, key, actions)
+                    installed[key] = actions
+                else:
+                    continue
+                n_msgs += 1
+                if n_msgs % self.host_flow_chunk == 0:
+                    update = self.flow_installer.flush(update)
+                    hub.sleep(0)    # 让出CPU，主机数很多时不长时间阻塞其他事件
+                    installed = self.installed_flows.setdefault(dpid, {})    # 期间整体重算可能替换了这台交换机的记录
+        print('sync host flows: {0} flow mods sent'.format(n_msgs))
+        self.last_route_update = self.flow_installer.flush(update)
+
+    def send_flow_mod(self, datapath, command, key, actions=()):
+        """
+        按flow_table中的表示下发一条流表项的增加、严格修改或严格删除
+        :param command: ofproto.OFPFC_ADD, OFPFC_MODIFY_STRICT或OFPFC_DELETE_STRICT
+        :param key: 流表项的键
+        :param actions: 流表项的动作
         """
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
-
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
-                                             actions)]
-        if buffer_id:
-            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
-                                    priority=priority, match=match,
-                                    instructions=inst, idle_timeout=60, hard_timeout=60)
+        priority = key[0]
+        match = to_match(parser, key)
+        if command == ofproto.OFPFC_DELETE_STRICT:
+            mod = parser.OFPFlowMod(datapath=datapath, command=command, priority=priority,
+                                    out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY,
+                                    match=match)
         else:
-                mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
-                                        match=match, instructions=inst
-                                        # ,idle_timeout=60, hard_timeout=60
-                                        )
-        datapath.send_msg(mod)
+            inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                                 to_actions(parser, actions))]
+            mod = parser.OFPFlowMod(datapath=datapath, command=command, priority=priority, cookie=ROUTE_COOKIE,
+                                    match=match, instructions=inst)
+        self.flow_installer.send(datapath, mod)
 
-    def drop_flow(self, datapath, match):
+    def send_group_mod(self, datapath, command, group_id, ports=()):
+        """
+        下发一个SELECT组表的增加、修改或删除，每个出端口对应一个bucket
+        :param command: ofproto.OFPGC_ADD, OFPGC_MODIFY或OFPGC_DELETE
+        """
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
-        mod = parser.OFPFlowMod(datapath=datapath,
-                                command=ofproto.OFPFC_DELETE,
-                                out_port=ofproto.OFPP_ANY,
-                                out_group=ofproto.OFPG_ANY,
-                                match=match)
-        datapath.send_msg(mod)
+        buckets = [parser.OFPBucket(weight=1, watch_port=ofproto.OFPP_ANY, watch_group=ofproto.OFPG_ANY,
+                                    actions=[parser.OFPActionOutput(port)])
+                   for port in ports]
+        mod = parser.OFPGroupMod(datapath, command, ofproto.OFPGT_SELECT, group_id, buckets)
+        self.flow_installer.send(datapath, mod)
 
-    def drop_all_flow_entities(self):
+    def sync_flows(self, desired_flows, desired_groups=None):
         """
-        删除所有流表
-        :return:
+        比较每台交换机上已经下发的流表项和新计算出的流表项，只下发新增、修改和删除的部分，
+        先增加和修改，再删除旧的流表项，避免转发中断；两者之间用barrier隔开，保证交换机按这个顺序处理
+        组表在引用它的流表项之前增加、修改，在引用它的流表项删除之后删除
+        保留期内不删除从交换机查询到的流表项和组表，它们仍记录在installed_flows和installed_groups中，
+        见end_reconcile_hold
+        :param desired_flows: {dpid: {键: 动作}}，由build_flow_set得到
+        :param desired_groups: {dpid: {group_id: (出端口, ...)}}
+        :return: RouteUpdate，所有交换机都处理完这些消息后触发
         """
-        for switch in self.switches:
-            datapath = switch.dp
-            parser = datapath.ofproto_parser
-            for mac in self.host:
-                print('mac: {0}'.format(mac))
-                match = parser.OFPMatch(eth_dst=mac)           # 必须保留table-miss和packet_in的流表项
-                self.drop_flow(datapath, match)
+        desired_groups = desired_groups or {}
+        n_msgs = 0
+        dpids = set(self.installed_flows) | set(desired_flows) | set(self.installed_groups) | set(desired_groups)
+        for dpid in dpids:
+            if dpid not in self.switchMap:
+                self.installed_flows.pop(dpid, None)
+                self.installed_groups.pop(dpid, None)
+                continue
+            if dpid in self.reconciling:
+                continue            # 查询完成后会再次同步
+            datapath = self.switches[self.switchMap[dpid]].dp
+            ofproto = datapath.ofproto
+            installed_groups = self.installed_groups.get(dpid, {})
+            desired_group = desired_groups.get(dpid, {})
+            group_adds, group_modifies, group_deletes = diff_flows(installed_groups, desired_group)
+            held = self.held_groups.get(dpid)
+            if held:
+                desired_group = dict(desired_group)
+                desired_group.update((group_id, installed_groups[group_id]) for group_id in group_deletes
+                                     if group_id in held)
+                group_deletes = [group_id for group_id in group_deletes if group_id not in held]
+            for group_id, ports in group_adds:
+                self.send_group_mod(datapath, ofproto.OFPGC_ADD, group_id, ports)
+            for group_id, ports in group_modifies:
+                self.send_group_mod(datapath, ofproto.OFPGC_MODIFY, group_id, ports)
+            self.flow_installer.barrier(datapath)
+            installed = self.installed_flows.get(dpid, {})
+            desired = desired_flows.get(dpid, {})
+            adds, modifies, deletes = diff_flows(installed, desired)
+            held = self.held_flows.get(dpid)
+            if held:
+                desired = dict(desired)
+                desired.update((key, installed[key]) for key in deletes if key in held)
+                deletes = [key for key in deletes if key not in held]
+            for key, actions in adds:
+                self.send_flow_mod(datapath, ofproto.OFPFC_ADD, key, actions)
+            for key, actions in modifies:
+                self.send_flow_mod(datapath, ofproto.OFPFC_MODIFY_STRICT, key, actions)
+            self.flow_installer.barrier(datapath)
+            for key in deletes:
+                self.send_flow_mod(datapath, ofproto.OFPFC_DELETE_STRICT, key)
+            self.flow_installer.barrier(datapath)
+            for group_id in group_deletes:
+                self.send_group_mod(datapath, ofproto.OFPGC_DELETE, group_id)
+            n_msgs += len(adds) + len(modifies) + len(deletes)
+            n_msgs += len(group_adds) + len(group_modifies) + len(group_deletes)
+            self.installed_flows[dpid] = desired
+            self.installed_groups[dpid] = desired_group
+        print('sync flows: {0} flow mods sent'.format(n_msgs))
+        return self.flow_installer.flush()
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev):
+        msg = ev.msg
+        update = self.flow_installer.barrier_reply(msg.datapath.id, msg.xid)
+        if update is not None:
+            self.report_route_update(update)
+
+    def report_route_update(self, update):
+        print('route update done: {0} flow mods, {1} barriers, {2:.3f}s'.format(
+            update.n_msgs, update.n_barriers, update.convergence_time()))
 
     def index2switch_id(self, switch_index_seq):
         """
@@ -202,15 +696,28 @@ class Topo(app_manager.RyuApp):
         self.getAdjMatrix()返回的数据形如： [[0. 1. 0.], [1. 0. 1.], [0. 1. 0.]]
         把它转化为：[[0.e+00 1.e+00 1.e+04], [1.e+00 0.e+00 1.e+00], [1.e+04 1.e+00 0.e+00]]
         """
-        dis_matrix = self.getAdjMatrix()
-        shape = self.getAdjMatrix().shape
-        n_pathes = shape[0]
-        for i in range(n_pathes):
-            for j in range(n_pathes):
-                if i != j and dis_matrix[i, j] == 0:
-                    dis_matrix[i, j] = INF
+        adj_matrix = self.getAdjMatrix()
+        dis_matrix = np.where(adj_matrix == 0, INF, adj_matrix)
+        np.fill_diagonal(dis_matrix, 0)
         return dis_matrix
 
+    def get_path_matrix(self):
+        """
+        返回交换机之间最短路径的前驱矩阵，编号为交换机在switches列表中的序号
+        链路变化已经增量更新到self.dynamic_path中，只有交换机变化后才需要整体重算
+        整体重算时引擎可能让出CPU(如parallel_dijkstra)，期间到达的链路事件无法增量更新到尚未生成的结果中，
+        因此计算完成后若拓扑版本号已经改变，丢弃这次结果并按最新的拓扑重算
+        """
+        while self.dynamic_path is None or self.dynamic_path.n != len(self.switches):
+            version = self.topo_version
+            n_switches = len(self.switches)
+            dis_matrix = self.handle_matrix()
+            engine = select_engine(n_switches, dis_matrix, self.path_engine)
+            dynamic_path = DynamicShortPath(n_switches, dis_matrix, engine.compute)
+            if self.topo_version == version:
+                self.dynamic_path = dynamic_path
+        return self.dynamic_path.path
+
     def get_switch_id_path_sequence(self):
         """
         switchMap中记录所有交换机id对应在switches列表中的序号，便于对应查找交换机，
@@ -219,10 +726,11 @@ class Topo(app_manager.RyuApp):
         如:<1,3,4,7>表示从id为1的交换机到id为7的交换机的最短路径是从交换机1到交换机3到交换机4到交换机7
         """
         n_switches = len(self.switches)
-        dis_matrix = self.handle_matrix()
+        if n_switches == 0:
+            return []
 
         # index_path_sequence中是以switch列表中的编号给出交换机之间的路径上的结点序列
-        index_path_sequence = get_all_short_path_sequence(n_switches, dis_matrix)
+        index_path_sequence = get_path_sequence(n_switches, self.get_path_matrix())
         id_path_sequence = []
         for index_path in index_path_sequence:
             id_path = self.index2switch_id(index_path)
@@ -277,22 +785,17 @@ class Topo(app_manager.RyuApp):
 
     def port_maps(self):
         """
-        通过link转换为交换机端口之间的连接关系
-        :param src_switch:
-        :param dst_switch:
-        :param in_or_out:
-        :return:
+        通过邻接关系转换为交换机端口之间的连接关系，结果缓存到下一次拓扑变化
+        :return: {(src_dpid, dst_dpid): (src_port_no, dst_port_no)}
         """
-        src_dst_port_map = dict()
-        for src, dst in self.links.items():  # src,dst是Port对象
-            src_dpid = src.dpid
-            dst_dpid = dst.dpid
-            src_port_no = src.port_no
-            dst_port_no = dst.port_no
-            # 将src_dpid作为源交换机，dst_dpid作为目的交换机，则src_port_no是源交换机的出端口，dst_port_no是目的交换机的入端口
-            src_dst_port_map[(src_dpid, dst_dpid)] = (src_port_no, dst_port_no)
-            src_dst_port_map[(dst_dpid, src_dpid)] = (dst_port_no, src_port_no)
-        return src_dst_port_map
+        if 'ports' not in self.adj_cache:
+            src_dst_port_map = dict()
+            for src_dpid, nbrs in self.adjacency.items():
+                for dst_dpid, ports in nbrs.items():
+                    # 将src_dpid作为源交换机，dst_dpid作为目的交换机，则src_port_no是源交换机的出端口，dst_port_no是目的交换机的入端口
+                    src_dst_port_map[(src_dpid, dst_dpid)] = next(iter(ports))
+            self.adj_cache['ports'] = src_dst_port_map
+        return self.adj_cache['ports']
 
     def get_port(self, src_switch, dst_switch, in_or_out, src_dst_port_map):
         """
@@ -338,117 +841,245 @@ class Topo(app_manager.RyuApp):
         若1:1->3:1，3:2->4:2,4:1->2:2表示交换机1的端口1连接交换机3的端口1，交换机3的端口2连接交换机4的端口2，剩下以此类推
         则转换后的端口序列为：[{"i_port":"unknown","out_port":1},{"i_port":1,"out_port":2},{"i_port":2,"out_port":1},{"i_port":2,"out_port":"unknown"}]
         其中交换机1和交换机2分别连接源主机和目的主机，因此，in_port和out_port分别为unknown
-        :return:
+        只有真正被用到的交换机对才会生成路径和端口序列，见RouteTable
+        路径变化时self.adj_cache一定被清空，因此RouteTable也放在adj_cache中，拓扑不变时重复使用，
+        主机变化时不必重新生成交换机对的路由
         """
-        switch_ids = [id for id in self.switchMap.keys()]  # 获得所有交换机的id，即获取所有交换机
-        path_dict = self.id_path_sequence2dict()
-        src_dst_port_map = self.port_maps()
-        # print('src_dst_port_map: {0}'.format(src_dst_port_map))
-
-        for src_id in switch_ids:
-            for dst_id in switch_ids:
-                # 当源结点交换机和目的结点交换机不是同一个交换机时，将交换结点序列转换为入、出端口序列
-                if src_id != dst_id:
-                    path = path_dict[(src_id, dst_id)]              # 获得从源结点到目的结点的最短路径序列
-                    ports_list = self.get_ports_with_path(path, src_dst_port_map)
-                    path_dict[(src_id, dst_id)] = [path, ports_list]
-        return path_dict
+        if 'routes' not in self.adj_cache:
+            src_dst_port_map = self.port_maps()
+            # print('src_dst_port_map: {0}'.format(src_dst_port_map))
+            path_matrix = self.get_path_matrix() if self.switches else []
+            switch_ids = [dpid for dpid, index in sorted(self.switchMap.items(), key=lambda item: item[1])]
+            self.adj_cache['routes'] = RouteTable(path_matrix, switch_ids,
+                                                  lambda path: self.get_ports_with_path(path, src_dst_port_map),
+                                                  self.route_cache_size)
+        return self.adj_cache['routes']
 
     def compute_path_between_all_hosts(self):
         """
         遍历网络中的所有IP对，返回每一对IP之间的最短路径上的交换机结点，以及每个结点的入端口和出端口
-        :return:
+        :return: {(src_ip, dst_ip): HostRoute}，HostRoute仍可以按[path, ports, macs]的格式解包
+        """
+        return dict(self.iter_host_routes())
+
+    def iter_host_routes(self, host_mac=None):
+        """
+        依次生成每一对IP之间的路由((src_ip, dst_ip), HostRoute)，可以边计算边下发流表，不必先生成全部主机对的路由
+        所有主机对共享RouteTable中的交换机对路由，每对主机只记录连接两台主机的端口
+        :param host_mac: 不为None时只生成以该主机为源或目的的路由
         """
-        ip_port_dict = {}
         path_dict = self.get_port_seq()  # path_dict[(src_id, dst_id)] = [path, ports_list]
+        # 交换机编号和端口号在这里一次性转换为整数，不在内层循环中重复转换
+        hosts = [(host_mac, host_info[2][0], int(host_info[0]), int(host_info[1]))
+                 for host_mac, host_info in self.host.items()]
+        if host_mac is None:
+            pairs = ((host0, host1) for host0 in hosts for host1 in hosts)
+        else:
+            host = next(h for h in hosts if h[0] == host_mac)
+            pairs = itertools.chain(((host, other) for other in hosts), ((other, host) for other in hosts))
+        for (host_mac0, host_ip0, nearest_switch0, switch_port0), \
+                (host_mac1, host_ip1, nearest_switch1, switch_port1) in pairs:
+            if host_mac0 == host_mac1:
+                continue
+            if nearest_switch0 == nearest_switch1:  # 若两台主机连接着同一台交换机
+                route = HostRoute((nearest_switch0, ), None, switch_port0, switch_port1,
+                                  (host_mac0, host_mac1))
+            else:
+                path, ports = path_dict[(nearest_switch0, nearest_switch1)]
+                route = HostRoute(path, ports, switch_port0, switch_port1, (host_mac0, host_mac1))
+            yield (host_ip0, host_ip1), route
 
-        # 测试每条路径上的端口序列是否正确
-        # print('*********************379 379*********************')
-        # for key, val in path_dict.items():
-        #     if key[0] and key[1]:
-        #         path = val[0]
-        #         ports = val[1]
-        #         print('path: {0}, ports: {1}'.format(path, ports))
-        # print('******************************************')
-
-        # 对每一对IP,返回它们之间的最短路径上的交换机结点及每个结点的入端口和出端口
-
-        for host_mac0, host_info0 in self.host.items():
-            host_ip0 = host_info0[2]
-            nearest_switch0 = host_info0[0]  # 注意：host_info0[0]是字符类型
-            switch_port0 = host_info0[1]  # 连接交换机的端口
-            for host_mac1, host_info1 in self.host.items():
-                if host_mac0 == host_mac1:
-                    continue
-                host_ip1 = host_info1[2]
-                nearest_switch1 = host_info1[0]
-                switch_port1 = host_info1[1]
-                nearest_switch0 = int(nearest_switch0)
-                nearest_switch1 = int(nearest_switch1)
-                mac_addr_dict = [host_mac0, host_mac1]
-                if nearest_switch0 == nearest_switch1:  # 若两台主机连接着同一台交换机
-                    path = [nearest_switch0, ]
-                    ports = [{"in_port": switch_port0, "out_port": switch_port1}, ]
-                    ip_port_dict[(host_ip0[0], host_ip1[0])] = [path, ports, mac_addr_dict]
-                else:
-                    # copy.deepcopy 浅拷贝导致的错误
-                    path = copy.deepcopy(path_dict[(nearest_switch0, nearest_switch1)][0])  # path是个列表，ports是一个嵌套了字典的列表
-                    ports = copy.deepcopy(path_dict[(nearest_switch0, nearest_switch1)][1])  # path是个列表，ports是一个嵌套了字典的列表
-                    # print('412 choice 2222222222')
-                    # print('host_ip0: {0}, switch_port0: {1}, host_ip1: {2}, switch_port1: {3}'.format(
-                    #     host_ip0, switch_port0, host_ip1, switch_port1))
-                    # print('before path: {0}, ports: {1}'.format(path, ports))
-
-                    # ports_new = ports
-                    ports[0]["in_port"] = switch_port0  # 入/出端口序列中的第一项的入端口连接着源主机的入端口
-                    ports[-1]["out_port"] = switch_port1  # 入/出端口序列中的最后一项的出端口连接着目的主机的出端口
-                    ip_port_dict[(host_ip0[0], host_ip1[0])] = [path, ports, mac_addr_dict]
-                    # print('真正下发的端口序列: {0}'.format(ports))
-                    # print('after path: {0}, ports: {1}'.format(path, ports))
-        return ip_port_dict
-
-    def add_flow_table_item(self, ip_port_dict):
-        """
-        最短路径计算完毕，下发流表
-        :return:
+    def build_flow_set(self, host_routes, desired_flows=None):
         """
-        # ip_port_dict = self.compute_path_between_all_hosts()
-        # 打印出
-        # print('=******************* ip_port_dict ********************=')
-        # for item in ip_port_dict:
-        #     print('{0}: {1}'.format(item, ip_port_dict[item]))
-        # print('=******************* ip_port_dict end********************=')
-
-        # 每一个host2host，对其所经过路径上的所有交换机下发流表
-        for item in ip_port_dict:
-            # src_ip = item[0]
-            # dst_ip = item[1]
-            src_ip, dst_ip = item
-            # print('146   items: {0}, src_ip: {1}, dst_ip: {2}'.format(item, src_ip, dst_ip))
-            connection = ip_port_dict[item]
-            path, ports, macs = connection
-            src_mac, dst_mac = macs
-            # print('path: {0}, ports: {1}, macs: {2}'.format(path, ports, macs))
-            # print('src_mac: {0}, dst_mac: {1}'.format(src_mac, dst_mac))
-            for i in range(len(path)):
-                switch_dpid = path[i]
-                # print('type of self.switchMap[switch_dpid]: {0}'.format(type(self.switchMap[switch_dpid])))
-                # print(self.switches[0].__dict__)
-                datapath = self.switches[self.switchMap[switch_dpid]].dp
-                parser = datapath.ofproto_parser
-                in_port = int(ports[i]['in_port'])
-                out_port = int(ports[i]['out_port'])
-
-                actions = [parser.OFPActionOutput(out_port)]  # 转发动作
-                match = parser.OFPMatch(
-                    ipv4_src=src_ip, ipv4_dst=dst_ip, eth_src=src_mac,
-                    eth_dst=dst_mac, eth_type=ether_types.ETH_TYPE_IP,
-                    in_port=in_port
-                )
-                match_drop = parser.OFPMatch(
-                    ipv4_src=src_ip, ipv4_dst=dst_ip, eth_src=src_mac,
-                    eth_dst=dst_mac, eth_type=ether_types.ETH_TYPE_IP,
-                )
-                actions_drop = []
-                self.add_flow(datapath, 2, match, actions)
-                self.add_flow(datapath, 1, match_drop, actions_drop)
+        由主机之间的路径计算出每台交换机上应该有的流表项
+        :param host_routes: compute_path_between_all_hosts的返回值，或iter_host_routes生成的序列
+        :param desired_flows: 不为None时把流表项加入其中，用于分批计算
+        :return: {dpid: {键: 动作}}
+        """
+        if desired_flows is None:
+            desired_flows = {}
+        if isinstance(host_routes, dict):
+            host_routes = host_routes.items()
+        for (src_ip, dst_ip), route in host_routes:
+            src_mac, dst_mac = route.macs
+            for switch_dpid, in_port, out_port in route.hops():
+                flows = desired_flows.setdefault(switch_dpid, {})
+                key = flow_key(2, ipv4_src=src_ip, ipv4_dst=dst_ip, eth_src=src_mac,
+                               eth_dst=dst_mac, eth_type=ether_types.ETH_TYPE_IP, in_port=in_port)
+                flows[key] = (('output', out_port),)
+                key_drop = flow_key(1, ipv4_src=src_ip, ipv4_dst=dst_ip, eth_src=src_mac,
+                                    eth_dst=dst_mac, eth_type=ether_types.ETH_TYPE_IP)
+                flows[key_drop] = ()
+        return desired_flows
+
+    def get_tree_to_switch(self, dst_dpid, src_dpids):
+        """
+        在以交换机dst_dpid为根的最短路径树上，求从src_dpids中各交换机到dst_dpid经过的每台交换机的出端口
+        链路是双向的，因此path[dst][s]即为从s到dst的路径上s的下一跳；只保留src_dpids到dst_dpid的路径上的交换机
+        :param dst_dpid: 目的交换机
+        :param src_dpids: 连接着源主机的交换机
+        :return: {dpid: 出端口}，不包括dst_dpid本身
+        """
+        self.get_path_matrix()
+        dst_index = self.switchMap[dst_dpid]
+        pred = self.dynamic_path.path[dst_index].tolist()
+        dis = self.dynamic_path.dis[dst_index].tolist()
+        switch_ids = [dpid for dpid, index in sorted(self.switchMap.items(), key=lambda item: item[1])]
+        src_dst_port_map = self.port_maps()
+        tree = {}
+        for src_dpid in src_dpids:
+            cur = src_dpid
+            while cur != dst_dpid and cur not in tree:
+                cur_index = self.switchMap.get(cur)
+                if cur_index is None or dis[cur_index] >= INF:
+                    break
+                nxt = switch_ids[pred[cur_index]]
+                ports = src_dst_port_map.get((cur, nxt))
+                if ports is None:
+                    break
+                tree[cur] = ports[0]
+                cur = nxt
+        return tree
+
+    def build_tree_flow_set(self):
+        """
+        按目的主机转发：对每个目的主机，在以其所连交换机为根的最短路径树上的每台交换机下发一条匹配
+        eth_dst和ipv4_dst的流表项，每台交换机上的流表项个数与主机个数成正比
+        :return: {dpid: {键: 动作}}
+        """
+        desired_flows = {}
+        if not self.switches:
+            return desired_flows
+        hosts_by_switch = self.get_hosts_by_switch()
+        edge_dpids = list(hosts_by_switch)
+        for dst_dpid, hosts in hosts_by_switch.items():
+            if dst_dpid not in self.switchMap:
+                continue
+            tree = self.get_tree_to_switch(dst_dpid, edge_dpids)
+            for host in hosts:
+                self.add_host_tree_flows(desired_flows, 2, dst_dpid, tree, host)
+        return desired_flows
+
+    def add_host_tree_flows(self, desired_flows, priority, dst_dpid, tree, host, prefix=None):
+        """
+        在desired_flows中加入以主机host为目的的流表项：目的交换机上输出到主机所连的端口，
+        最短路径树tree上的其他交换机输出到下一跳
+        :param host: (主机mac, 连接的端口号, 主机ip列表)
+        :param prefix: 目的交换机的地址前缀(get_switch_prefix的返回值)，主机地址在前缀中时树上的交换机不需要流表项
+        """
+        host_mac, host_port, host_ip = host
+        key = flow_key(priority, ipv4_dst=host_ip[0], eth_dst=host_mac, eth_type=ether_types.ETH_TYPE_IP)
+        desired_flows.setdefault(dst_dpid, {})[key] = (('output', host_port),)
+        if prefix is not None and prefix[0] <= ip_to_int(host_ip[0]) <= prefix[1]:
+            return
+        for switch_dpid, out_port in tree.items():
+            desired_flows.setdefault(switch_dpid, {})[key] = (('output', out_port),)
+
+    def get_switch_prefix(self, dpid):
+        """
+        :return: (第一个地址, 最后一个地址, (网络地址, 掩码))，前两项为整数，最后一项用作ipv4_dst的匹配值；
+                 交换机没有地址前缀时返回None
+        """
+        prefix = self.dhcp.switch_prefix(dpid) if self.dhcp is not None else None
+        if prefix is None:
+            return None
+        first, last = parse_range(prefix)
+        return first, last, (int_to_ip(first), int_to_ip(~(last - first) & 0xffffffff))
+
+    def build_prefix_flow_set(self):
+        """
+        按目的交换机的地址前缀转发：在以目的交换机为根的最短路径树上的每台交换机下发一条匹配前缀的流表项，
+        目的交换机上为每个主机下发一条流表项；地址不在所连交换机前缀中的主机(如迁移到其他交换机的主机)
+        与tree模式一样在树上逐个下发，优先级高于前缀流表项
+        :return: {dpid: {键: 动作}}
+        """
+        desired_flows = {}
+        if not self.switches:
+            return desired_flows
+        hosts_by_switch = self.get_hosts_by_switch()
+        edge_dpids = list(hosts_by_switch)
+        for dst_dpid, hosts in hosts_by_switch.items():
+            if dst_dpid not in self.switchMap:
+                continue
+            tree = self.get_tree_to_switch(dst_dpid, edge_dpids)
+            prefix = self.get_switch_prefix(dst_dpid)
+            for host in hosts:
+                self.add_host_tree_flows(desired_flows, 3, dst_dpid, tree, host, prefix)
+            if prefix is not None:
+                key = flow_key(2, ipv4_dst=prefix[2], eth_type=ether_types.ETH_TYPE_IP)
+                for switch_dpid, out_port in tree.items():
+                    desired_flows.setdefault(switch_dpid, {})[key] = (('output', out_port),)
+        return desired_flows
+
+    def get_hosts_by_switch(self):
+        """
+        :return: {dpid: [(主机mac, 连接的端口号, 主机ip列表), ...]}，按主机所连的交换机分组
+        """
+        hosts_by_switch = {}
+        for host_mac, host_info in self.host.items():
+            hosts_by_switch.setdefault(int(host_info[0]), []).append((host_mac, int(host_info[1]), host_info[2]))
+        return hosts_by_switch
+
+    def get_group_id(self, dst_dpid):
+        """
+        :return: 指向目的交换机dst_dpid的ECMP组表的编号
+        """
+        if dst_dpid not in self.group_ids:
+            self.group_ids[dst_dpid] = len(self.group_ids) + 1
+        return self.group_ids[dst_dpid]
+
+    def get_ecmp_dag_to_switch(self, dst_dpid, src_dpids):
+        """
+        求从src_dpids中各交换机到dst_dpid的所有等价最短路径上，每台交换机通往dst_dpid的所有出端口
+        :return: {dpid: (出端口, ...)}，不包括dst_dpid本身
+        """
+        self.get_path_matrix()
+        next_hops = get_equal_cost_next_hops(self.dynamic_path.weight, self.dynamic_path.dis,
+                                             self.switchMap[dst_dpid])
+        switch_ids = [dpid for dpid, index in sorted(self.switchMap.items(), key=lambda item: item[1])]
+        src_dst_port_map = self.port_maps()
+        dag = {}
+        stack = list(src_dpids)
+        while stack:
+            cur = stack.pop()
+            if cur == dst_dpid or cur in dag or cur not in self.switchMap:
+                continue
+            nxts = [switch_ids[k] for k in np.nonzero(next_hops[self.switchMap[cur]])[0]]
+            ports = tuple(sorted(src_dst_port_map[(cur, nxt)][0] for nxt in nxts
+                                 if (cur, nxt) in src_dst_port_map))
+            if not ports:
+                continue
+            dag[cur] = ports
+            stack.extend(nxts)
+        return dag
+
+    def build_ecmp_flow_set(self):
+        """
+        等价多路径转发：与build_tree_flow_set一样每台交换机上每个目的主机一条流表项，
+        但交换机到目的交换机有多个等价下一跳时，流表项指向一个SELECT组表，组表中每个下一跳对应一个bucket
+        :return: (desired_flows, desired_groups)
+        """
+        desired_flows = {}
+        desired_groups = {}
+        if not self.switches:
+            return desired_flows, desired_groups
+        hosts_by_switch = self.get_hosts_by_switch()
+        edge_dpids = list(hosts_by_switch)
+        for dst_dpid, hosts in hosts_by_switch.items():
+            if dst_dpid not in self.switchMap:
+                continue
+            dag = self.get_ecmp_dag_to_switch(dst_dpid, edge_dpids)
+            switch_actions = {}
+            for switch_dpid, ports in dag.items():
+                if len(ports) == 1:
+                    switch_actions[switch_dpid] = (('output', ports[0]),)
+                else:
+                    group_id = self.get_group_id(dst_dpid)
+                    desired_groups.setdefault(switch_dpid, {})[group_id] = ports
+                    switch_actions[switch_dpid] = (('group', group_id),)
+            for host_mac, host_port, host_ip in hosts:
+                key = flow_key(2, ipv4_dst=host_ip[0], eth_dst=host_mac, eth_type=ether_types.ETH_TYPE_IP)
+                desired_flows.setdefault(dst_dpid, {})[key] = (('output', host_port),)
+                for switch_dpid, actions in switch_actions.items():
+                    desired_flows.setdefault(switch_dpid, {})[key] = actions
+        return desired_flows, desired_groups